@@ -1 +1 @@
-python3 src/main.py "/staticsitepython/"
\ No newline at end of file
+python3 src/main.py "/staticsitepython/" --yes
\ No newline at end of file
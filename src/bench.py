@@ -0,0 +1,221 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from main import (block_memo, block_to_block_type, generate_pages_recursive, get_node,
+                  markdown_to_blocks, set_block_memo_size, text_to_textnodes)
+from main import BlockType
+
+WORDS = ("the ring of power was forged in the fires of mount doom by sauron the "
+         "deceiver while elves men and dwarves gathered at rivendell to decide").split()
+
+DEFAULT_MIX = {"paragraph": 4, "inline": 3, "list": 2, "code": 1, "quote": 1, "heading": 2}
+
+def words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def inline_text(rng, n):
+    """
+    A sentence with every kind of inline markup sprinkled through it.
+    """
+    parts=[]
+    for _ in range(n):
+        kind = rng.randrange(8)
+        if kind == 0:
+            parts.append(f"**{words(rng, 2)}**")
+        elif kind == 1:
+            parts.append(f"_{words(rng, 2)}_")
+        elif kind == 2:
+            parts.append(f"`{rng.choice(WORDS)}`")
+        elif kind == 3:
+            parts.append(f"[{words(rng, 2)}](/blog/{rng.choice(WORDS)})")
+        elif kind == 4:
+            parts.append(f"![{words(rng, 2)}](/images/{rng.choice(WORDS)}.png)")
+        else:
+            parts.append(words(rng, 4))
+    return " ".join(parts)
+
+def make_block(rng, kind):
+    match kind:
+        case "paragraph":
+            return "\n".join(words(rng, 12) for _ in range(rng.randint(1, 4)))
+        case "inline":
+            return inline_text(rng, rng.randint(4, 12))
+        case "list":
+            if rng.random() < 0.5:
+                return "\n".join(f"- {inline_text(rng, 2)}" for _ in range(rng.randint(2, 10)))
+            return "\n".join(f"{i}. {inline_text(rng, 2)}" for i in range(1, rng.randint(3, 11)))
+        case "code":
+            return "```\n" + "\n".join(words(rng, 6) for _ in range(rng.randint(2, 20))) + "\n```"
+        case "quote":
+            return "\n".join(f"> {words(rng, 8)}" for _ in range(rng.randint(1, 4)))
+        case "heading":
+            return "#" * rng.randint(2, 6) + " " + words(rng, 4)
+
+def make_page(rng, blocks, mix):
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=blocks)
+    return "\n\n".join([f"# {words(rng, 4)}"] + [make_block(rng, kind) for kind in kinds]) + "\n"
+
+def generate_corpus(root, pages=100, blocks=30, mix=None, seed=0):
+    """
+    Write a synthetic content/ tree of `pages` index.md files under root.
+    Returns the list of markdown texts written.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    texts=[]
+    for i in range(pages):
+        pageDir = os.path.join(root, "blog", f"post{i:05d}") if i else root
+        os.makedirs(pageDir, exist_ok=True)
+        md = make_page(rng, blocks, mix)
+        with open(os.path.join(pageDir, "index.md"), "w") as fp:
+            fp.write(md)
+        texts.append(md)
+    return texts
+
+def make_big_block(rng, kind, lines):
+    """
+    One list or code block of `lines` lines, the shape of generated reference pages.
+    """
+    if kind == "list":
+        return "\n".join(f"- {inline_text(rng, 2)}" for _ in range(lines))
+    if kind == "code":
+        return "```\n" + "\n".join("    " + words(rng, 6) for _ in range(lines)) + "\n```"
+    raise ValueError(f"Unknown block kind {kind}, expected list or code")
+
+def block_scaling(kind, sizes, repeat=3, seed=0):
+    """
+    Render one `kind` block of each size (in lines) into /dev/null, timing it and
+    tracing its peak memory. With linear rendering the per-line columns stay flat
+    as the block grows.
+    """
+    rng = random.Random(seed)
+    results=[]
+    for lines in sizes:
+        block = make_big_block(rng, kind, lines)
+        blockType = block_to_block_type(block)
+        with open(os.devnull, "w") as devnull:
+            timing = best_of(lambda: get_node(block, blockType).write_html(devnull), repeat)
+            tracemalloc.start()
+            get_node(block, blockType).write_html(devnull)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append({
+            "lines": lines,
+            "bytes": len(block),
+            "best": timing["best"],
+            "seconds_per_line": timing["best"] / lines,
+            "peak_bytes": peak,
+            "peak_bytes_per_line": peak / lines,
+        })
+    return results
+
+def best_of(fn, repeat):
+    runs=[]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"best": min(runs), "runs": runs}
+
+def run(pages=100, blocks=30, mix=None, seed=0, repeat=3, template_path="template.html"):
+    results={}
+    with tempfile.TemporaryDirectory() as tmp:
+        content = os.path.join(tmp, "content")
+        texts = generate_corpus(content, pages, blocks, mix, seed)
+
+        allBlocks = [block for md in texts for block in markdown_to_blocks(md)]
+        typed = [(block, block_to_block_type(block)) for block in allBlocks]
+        inline = [block for block, blockType in typed if blockType in (BlockType.PARAGRAPH, BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST)]
+        nodes = [get_node(block, blockType) for block, blockType in typed]
+
+        results["markdown_to_blocks"] = best_of(lambda: [markdown_to_blocks(md) for md in texts], repeat)
+        results["block_to_block_type"] = best_of(lambda: [block_to_block_type(block) for block in allBlocks], repeat)
+        results["text_to_textnodes"] = best_of(lambda: [text_to_textnodes(block) for block in inline], repeat)
+        results["get_node"] = best_of(lambda: [get_node(block, blockType) for block, blockType in typed], repeat)
+        results["serialize"] = best_of(lambda: [node.to_html() for node in nodes], repeat)
+
+        def end_to_end():
+            # Every run starts from an empty block memo, like a fresh build process,
+            # or the runs after the first would only measure memo hits.
+            block_memo.clear()
+            out = tempfile.mkdtemp(dir=tmp)
+            generate_pages_recursive(content, template_path, out, "/")
+        # generate_page prints a line per page, keep that out of the timings output.
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            maxEntries = block_memo.max_entries
+            try:
+                results["generate_pages_recursive"] = best_of(end_to_end, repeat)
+                set_block_memo_size(0)
+                results["generate_pages_recursive_no_memo"] = best_of(end_to_end, repeat)
+            finally:
+                set_block_memo_size(maxEntries)
+                block_memo.clear()
+                sys.stdout = stdout
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pages": pages,
+        "blocks_per_page": blocks,
+        "seed": seed,
+        "mix": mix or DEFAULT_MIX,
+        "bytes": sum(len(md.encode()) for md in texts),
+        "blocks": len(allBlocks),
+        "results": results,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_mix(text):
+    mix={}
+    for item in text.split(","):
+        kind, weight = item.split("=")
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown block kind {kind}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight)
+    return mix
+
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Time each stage of the markdown to html pipeline on a synthetic corpus.")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=30, help="blocks per page")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="block weights, e.g. paragraph=4,inline=3,list=2,code=1,quote=1,heading=2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--template", default="template.html")
+    parser.add_argument("--output", help="write the json results here instead of stdout")
+    parser.add_argument("--corpus", help="only write the synthetic content tree to this directory")
+    parser.add_argument("--scaling", choices=["list", "code"],
+                        help="instead of the pipeline, time and trace one block of this kind at each --sizes")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated block sizes in lines for --scaling (default 1000,10000,100000)")
+    args = parser.parse_args()
+    if args.corpus:
+        generate_corpus(args.corpus, args.pages, args.blocks, args.mix, args.seed)
+        sys.exit(0)
+    if args.scaling:
+        sizes = [int(size) for size in args.sizes.split(",")]
+        report = {"commit": git_commit(), "python": platform.python_version(), "kind": args.scaling,
+                  "results": block_scaling(args.scaling, sizes, args.repeat, args.seed)}
+    else:
+        report = run(args.pages, args.blocks, args.mix, args.seed, args.repeat, args.template)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
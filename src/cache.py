@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Bump this whenever a parser change alters the html or the entry layout changes, so old entries stop matching.
+PARSER_VERSION = "5"
+
+class RenderCache():
+    """
+    On-disk cache of rendered page content, keyed by the hash of the markdown and
+    the parser version. Each entry is a file holding the title line, the content html
+    and, on the last line, the page's link and image urls as json. The urls come
+    last because a page's are only known once it has been parsed through. Hits touch the
+    file's mtime, and once the cache grows past max_bytes the least recently used
+    entries are deleted.
+    """
+    def __init__(self, root, max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = None    # Counted on the first store.
+
+    def key(self, source_hash):
+        return hashlib.sha256(f"{PARSER_VERSION}:{source_hash}".encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """
+        Return (title, refs, content chunks) for a cached page, or None.
+        """
+        path = self.path(key)
+        try:
+            fp = open(path, "r")
+        except FileNotFoundError:
+            return None
+        with fp:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted by another worker since the open, the handle still reads it.
+                pass
+            title = fp.readline().rstrip("\n")
+            # Read now, so no open file outlives the call.
+            html, refs = fp.read().rsplit("\n", 1)
+        return title, json.loads(refs), [html]
+
+    def put(self, key, title, chunks, refs=()):
+        """
+        Store the page while passing its chunks through, so it can be written out at the same time.
+        refs may still be filling up while the chunks go by, it is read after the last one.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(title + "\n")
+                for chunk in chunks:
+                    fp.write(chunk)
+                    yield chunk
+                fp.write("\n" + json.dumps(list(refs)))
+            os.replace(tmpPath, path)
+        except BaseException:
+            os.remove(tmpPath)
+            raise
+        self.added(os.path.getsize(path))
+
+    def entries(self):
+        found=[]
+        if not os.path.isdir(self.root):
+            return found
+        for prefix in os.scandir(self.root):
+            if prefix.is_dir():
+                for entry in os.scandir(prefix.path):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return found
+
+    def added(self, size):
+        if self.size == None:
+            self.size = sum(entry[1] for entry in self.entries())
+        else:
+            self.size += size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries until the cache is back under 90% of its cap.
+        entries = sorted(self.entries())
+        self.size = sum(entry[1] for entry in entries)
+        for mtime, size, path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from main import extract_title, find_pages, markdown_to_html_node
+from template import Template
+from htmlnode import escape_text
+
+def scan_mtimes(root):
+    """
+    Return {path: mtime} for every file under root.
+    """
+    mtimes={}
+    if os.path.isfile(root):
+        mtimes[root] = os.stat(root).st_mtime_ns
+        return mtimes
+    stack=[root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                else:
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+    return mtimes
+
+class DevSite():
+    """
+    The site kept in memory. Each page's parsed content is cached so a template
+    edit only re-runs the templating, and a markdown edit only re-parses that page.
+    """
+    def __init__(self, content_dir, template_path, static_dir, basepath="/"):
+        self.content_dir = content_dir
+        self.template_path = template_path
+        self.static_dir = static_dir
+        self.basepath = basepath
+        self.lock = threading.Lock()
+        self.template = Template.load(template_path, basepath)
+        self.parsed = {}    # markdown path -> (title, content html)
+        self.pages = {}     # url path -> page bytes
+        self.urls = {}      # markdown path -> url path
+        self.mtimes = {}
+        self.rebuild()
+
+    def render(self, src):
+        with open(src, "r") as fp:
+            md = fp.read()
+        self.parsed[src] = (extract_title(md), markdown_to_html_node(md).to_html())
+        self.publish(src)
+
+    def publish(self, src):
+        title, content = self.parsed[src]
+        page = self.template.render(Title=escape_text(title), Content=content).encode()
+        with self.lock:
+            self.pages[self.urls[src]] = page
+
+    def rebuild(self):
+        """
+        Bring the in-memory site up to date with the files on disk. Returns the changed paths.
+        """
+        mtimes = scan_mtimes(self.content_dir)
+        mtimes.update(scan_mtimes(self.template_path))
+        changed = [path for path in mtimes if self.mtimes.get(path) != mtimes[path]]
+        removed = [path for path in self.mtimes if path not in mtimes]
+        self.mtimes = mtimes
+        if not changed and not removed:
+            return []
+
+        self.urls = {}
+        for src, dest in find_pages(self.content_dir, "/"):
+            self.urls[src] = dest.replace(os.sep, "/")
+        for src in removed:
+            self.parsed.pop(src, None)
+        with self.lock:
+            live = set(self.urls.values())
+            for url in list(self.pages):
+                if url not in live:
+                    del self.pages[url]
+
+        templateChanged = self.template_path in changed
+        if templateChanged:
+            self.template = Template.load(self.template_path, self.basepath)
+        for src in self.urls:
+            if src in changed or src not in self.parsed:
+                try:
+                    self.render(src)
+                except Exception as e:
+                    # Keep serving the last good version while the page is being edited.
+                    print(f"Error building {src}: {e}")
+            elif templateChanged:
+                self.publish(src)
+        return changed + removed
+
+    def watch(self, interval=0.2):
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            changed = self.rebuild()
+            if changed:
+                print(f"Rebuilt {len(changed)} changed file(s) in {(time.perf_counter()-start)*1000:.0f}ms")
+
+    def lookup(self, path):
+        """
+        Return the page bytes for a request path, or None if it isn't a page.
+        """
+        path = path.split("?", 1)[0].split("#", 1)[0]
+        if self.basepath != "/" and path.startswith(self.basepath):
+            path = "/" + path[len(self.basepath):]
+        if path.endswith("/"):
+            path += "index.html"
+        with self.lock:
+            return self.pages.get(path) or self.pages.get(path + "/index.html")
+
+def make_handler(site):
+    class DevHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            # Anything that isn't a page is served straight from static/.
+            super().__init__(*args, directory=site.static_dir, **kwargs)
+
+        def translate_path(self, path):
+            if site.basepath != "/" and path.startswith(site.basepath):
+                path = "/" + path[len(site.basepath):]
+            return super().translate_path(path)
+
+        def do_GET(self):
+            page = site.lookup(self.path)
+            if page == None:
+                return super().do_GET()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(page)
+    return DevHandler
+
+def serve(port=8888, basepath="/"):
+    site = DevSite("content", "template.html", "static", basepath)
+    threading.Thread(target=site.watch, daemon=True).start()
+    server = ThreadingHTTPServer(("", port), make_handler(site))
+    print(f"Serving on http://localhost:{port}{basepath} (watching content/ and template.html, static/ is served as is)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the site from memory and rebuild pages as they change.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("-p", "--port", type=int, default=8888)
+    args = parser.parse_args()
+    serve(args.port, args.basepath)
@@ -1,5 +1,31 @@
 
+def escape_text(text):
+    """
+    Escape text for use between tags. Most text has nothing to escape, and the
+    three "in" checks are much cheaper than always running the replaces.
+    """
+    if "&" not in text and "<" not in text and ">" not in text:
+        return text
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def escape_attr(value):
+    """
+    Escape a value for use inside a double quoted attribute.
+    """
+    value = str(value)
+    if "&" not in value and "<" not in value and ">" not in value and "\"" not in value:
+        return value
+    return escape_text(value).replace("\"", "&quot;")
+
+def props_to_html(props):
+    if not props:
+        return ""
+    return "".join([f" {prop}=\"{escape_attr(value)}\"" for prop, value in props.items()])
+
 class HTMLNode():
+    # Slots instead of a per-node __dict__, builds create a lot of nodes.
+    __slots__ = ("tag", "value", "children", "_props", "_props_html")
+
     def __init__(self,tag=None,value=None,children=None,props=None):
         self.tag = tag
         self.value=value
@@ -9,17 +35,31 @@ class HTMLNode():
     
     def to_html(self):
         raise NotImplementedError()
+
+    def iter_html(self):
+        """
+        Yield the html for this node in chunks. Subclasses that only define
+        to_html still work here, as one big chunk.
+        """
+        yield self.to_html()
+
+    def write_html(self, sink):
+        sink.writelines(self.iter_html())
     
-    def props_to_html(self):
-        prop_str=""
+    @property
+    def props(self):
+        return self._props
 
-        # I want self.props to default to an empty list, but instructions didn't say so...
-        if self.props == None:
-            return prop_str
+    @props.setter
+    def props(self, props):
+        self._props = props
+        self._props_html = None
 
-        for prop in self.props:
-            prop_str += f" {prop}=\"" + self.props[prop] + "\""
-        return prop_str
+    def props_to_html(self):
+        # Rendered once per node. Assigning node.props resets it, changing the dict in place doesn't.
+        if self._props_html == None:
+            self._props_html = props_to_html(self._props)
+        return self._props_html
     
     def __repr__(self):
         return f"Tag={self.tag}, value={self.value}, props={self.props}, children={self.children}"
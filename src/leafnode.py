@@ -1,27 +1,32 @@
 from htmlnode import HTMLNode
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self,tag,value,props=None):
         self.tag=tag
         self.value=value
+        self.children=None
         self.props=props
 
     def to_html(self):
+        if self.tag == None:
+            # No tag means the value is already html (or plain text).
+            return self.value if self.value != None else ""
         if self.value != None:
             return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
         else:
             return f"<{self.tag}{self.props_to_html()}></{self.tag}>"
-    
-    def props_to_html(self):
-        prop_str=""
-
-        # I want self.props to default to an empty list, but instructions didn't say so...
-        if self.props == None:
-            return prop_str
 
-        for prop in self.props:
-            prop_str += f" {prop}=\"{self.props[prop]}\""
-        return prop_str
+    def iter_html(self):
+        if self.tag == None:
+            if self.value:
+                yield self.value
+            return
+        yield f"<{self.tag}{self.props_to_html()}>"
+        if self.value:
+            yield self.value
+        yield f"</{self.tag}>"
     
     def __repr__(self):
         return f"Tag={self.tag}, value={self.value}, props={self.props}"
\ No newline at end of file
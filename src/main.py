@@ -1,8 +1,27 @@
 import textnode
 from leafnode import LeafNode
 from parentnode import ParentNode
+from htmlnode import escape_text
+import gzip
+import hashlib
+import itertools
+import json
+import locale
+import mmap
+import os
 import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
+from manifest import Manifest, hash_file, url_path
+from template import Template, find_refs
+from cache import RenderCache
+import profiler
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     new_nodes=[]
@@ -87,25 +106,102 @@ def split_nodes_image(old_nodes):
             new_nodes.append(node)
     return new_nodes
 
-def text_to_textnodes(text):
-    node = textnode.TextNode(text,textnode.TextType.TEXT)
-    nodes = [node]
-    nodes = split_nodes_delimiter(nodes,"**",textnode.TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes,"_",textnode.TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes,"`",textnode.TextType.CODE)
-    nodes = split_nodes_image(nodes)
+INLINE_START = re.compile(r"\*\*|_|`|!*\[")
+# Link text and urls can't contain a delimiter, those were split off before links in the old passes.
+INLINE_LINK = re.compile(r"(!*)\[((?:[^\[\]\n*_`]|\*(?!\*))*)\]\(((?:[^)\n*_`]|\*(?!\*))*)\)")
+INLINE_DELIMITERS = {
+    "**": textnode.TextType.BOLD,
+    "_": textnode.TextType.ITALIC,
+    "`": textnode.TextType.CODE,
+}
+
+def tokenize_inline(text):
+    """
+    Split inline markdown into TextNodes in a single left to right scan.
+    Gives the same nodes as the split_nodes_delimiter/split_nodes_image passes
+    for well formed text, without rebuilding the node list once per delimiter.
+    """
+    nodes=[]
+    pos = 0     # Where the scan continues from.
+    textStart = 0   # Start of the plain text not yet emitted.
+    while True:
+        match = INLINE_START.search(text, pos)
+        if match == None:
+            break
+        start = match.start()
+        token = match.group(0)
+        if token in INLINE_DELIMITERS:
+            end = text.find(token, match.end())
+            if end == -1:
+                raise Exception("Invalid syntax, missing delimiter: " + token + " in: " + text)
+            if start > textStart:
+                nodes.append(textnode.TextNode(text[textStart:start], textnode.TextType.TEXT))
+            nodes.append(textnode.TextNode(text[match.end():end], INLINE_DELIMITERS[token]))
+            pos = textStart = end + len(token)
+            continue
+        link = INLINE_LINK.match(text, start)
+        if link == None:
+            # A lone "[" or "!" is just text.
+            pos = start + 1
+            continue
+        if start > textStart:
+            nodes.append(textnode.TextNode(text[textStart:start], textnode.TextType.TEXT))
+        if link.group(1):
+            nodes.append(textnode.TextNode(link.group(2), textnode.TextType.IMAGE, url=link.group(3)))
+        else:
+            nodes.append(textnode.TextNode(link.group(2), textnode.TextType.LINK, url=link.group(3)))
+        pos = textStart = link.end()
+    if textStart < len(text):
+        nodes.append(textnode.TextNode(text[textStart:], textnode.TextType.TEXT))
     return nodes
 
+def text_to_textnodes(text):
+    if profiler.active != None:
+        with profiler.timed("inline parse"):
+            return tokenize_inline(text)
+    return tokenize_inline(text)
+
+def iter_blocks(lines, starts=None):
+    """
+    Yield blocks from an iterable of lines (an open file works), one block at a time.
+    Blocks are separated by empty lines and their lines are stripped, except inside
+    ``` fences where blank lines and indentation belong to the code.
+    starts, if given, gets the line number (from 1) of each block's first line
+    appended to it just before the block is yielded.
+    """
+    block=[]
+    inFence = False
+    start = 0
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not block:
+            start = number
+        clean = line.strip()
+        if inFence:
+            if clean.startswith("```"):
+                inFence = False
+                block.append(clean)
+            else:
+                block.append(line)
+            continue
+        if line == "":
+            if block:
+                if starts != None:
+                    starts.append(start)
+                yield "\n".join(block).strip()
+                block=[]
+            continue
+        if clean.startswith("```"):
+            # A fence opened and closed on one line doesn't start a fenced section.
+            inFence = len(clean) < 6 or not clean.endswith("```")
+        block.append(clean)
+    if block:
+        if starts != None:
+            starts.append(start)
+        yield "\n".join(block).strip()
+
 def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    for i in range(0,len(blocks)):
-        clean=[]
-        for line in blocks[i].split("\n"):
-            if line !="":
-                clean.append(line.strip())
-        blocks[i]="\n".join(clean)
-    blocks = list(filter(lambda text: text!="", blocks))
-    return blocks
+    return [block for block in iter_blocks(markdown.split("\n")) if block != ""]
 
 class BlockType(Enum):
     PARAGRAPH=""
@@ -115,30 +211,81 @@ class BlockType(Enum):
     UNORDERED_LIST=r"^- "
     ORDERED_LIST=r"^[0-9]+\."
 
+HEADING_PREFIX = re.compile(BlockType.HEADING.value)
+ORDERED_LIST_PREFIX = re.compile(BlockType.ORDERED_LIST.value)
+ORDERED_LIST_ITEM = re.compile(r"^[0-9]+\. ")
+
+def is_code_block(textBlock):
+    # Same as BlockType.CODE: ``` at the start and ``` at the end, where $ also allows one trailing newline.
+    end = len(textBlock) - 1 if textBlock.endswith("\n") else len(textBlock)
+    return end >= 6 and textBlock.startswith("```") and textBlock.endswith("```", 0, end)
+
 def block_to_block_type(textBlock):
-    headingList = re.findall(BlockType.HEADING.value,textBlock)
-    codeList = re.findall(BlockType.CODE.value,textBlock)
-    quoteList = re.findall(BlockType.QUOTE.value,textBlock)
-    unList = re.findall(BlockType.UNORDERED_LIST.value,textBlock)
-    ordList = re.findall(BlockType.ORDERED_LIST.value,textBlock)
-
-    if headingList:
-        return BlockType.HEADING
-    elif codeList:
-        return BlockType.CODE
-    elif quoteList:
-        return BlockType.QUOTE
-    elif unList:
-        return BlockType.UNORDERED_LIST
-    elif ordList:
-        return BlockType.ORDERED_LIST
-    else:
+    # Every type starts with a different character, so the first one picks the only check worth doing.
+    if not textBlock:
         return BlockType.PARAGRAPH
+    first = textBlock[0]
+    if first == "#":
+        if HEADING_PREFIX.match(textBlock):
+            return BlockType.HEADING
+    elif first == "`":
+        if is_code_block(textBlock):
+            return BlockType.CODE
+    elif first == ">":
+        return BlockType.QUOTE
+    elif first == "-":
+        if textBlock.startswith("- "):
+            return BlockType.UNORDERED_LIST
+    elif "0" <= first <= "9":
+        if ORDERED_LIST_PREFIX.match(textBlock):
+            return BlockType.ORDERED_LIST
+    return BlockType.PARAGRAPH
 
-def get_node(block, blockType):
+def collect_refs(texts, refs, line=0):
+    """
+    Append (url, line) for every link and image in texts to refs, with line
+    counted in lines from the start of the block.
+    """
+    if refs != None:
+        for text in texts:
+            if text.url != None:
+                refs.append((text.url, line))
+            line += text.text.count("\n")
+
+def code_text(block):
+    """
+    The text of a ``` code block without its fences, cut out with a single slice.
+    When the opening fence is on a line of its own, the first code line keeps its
+    indentation.
+    """
+    start = 0
+    while start < len(block) and block[start] == "`":
+        start += 1
+    end = len(block)
+    while end > start and block[end - 1] == "`":
+        end -= 1
+    # Drop the rest of the opening fence line and any blank lines after it.
+    fenceEnd = start
+    newline = block.find("\n", start, end)
+    while newline != -1 and block[start:newline].strip() == "":
+        start = newline + 1
+        newline = block.find("\n", start, end)
+    if start == fenceEnd:
+        while start < end and block[start].isspace():
+            start += 1
+    while end > start and block[end - 1].isspace():
+        end -= 1
+    return block[start:end]
+
+def get_node(block, blockType, refs=None):
+    """
+    refs, if given, gets the (url, line in the block) of every link and image in
+    the block appended to it.
+    """
     match blockType:
         case BlockType.PARAGRAPH:
             texts = text_to_textnodes(block)
+            collect_refs(texts, refs)
             content=""
             for text in texts:
                 content+=text.to_html()
@@ -152,66 +299,406 @@ def get_node(block, blockType):
                 if level == 6:
                     break
             # Heading in mark down can't have children...
-            return LeafNode(f"h{level}", block.lstrip("# ").strip())
+            return LeafNode(f"h{level}", escape_text(block.lstrip("# ").strip()))
         case BlockType.CODE:
-            node = LeafNode("code",block.strip("`").strip())
+            node = LeafNode("code",escape_text(code_text(block)))
             return ParentNode("pre", [node])
         case BlockType.QUOTE:
             blockLines = block.split("\n")
             lines=[]
             for blockLine in blockLines:
-                lines.append(blockLine.strip(">").strip())
+                lines.append(escape_text(blockLine.strip(">").strip()))
             return LeafNode("blockquote", "<br>".join(lines))
         case BlockType.UNORDERED_LIST:
             blockLines = block.split("\n")
             children=[]
-            for blockLine in blockLines:
+            for i, blockLine in enumerate(blockLines):
                 cleanLine = blockLine.strip("- ").strip()
                 childNodes = text_to_textnodes(cleanLine)
-                content = ""
-                for node in childNodes:
-                 #   print(node)
-                    content += node.to_html()
-                #print(content)
-                children.append(LeafNode("li",content))
+                collect_refs(childNodes, refs, i)
+                # One join per item, the list itself is only joined when it is written.
+                children.append(LeafNode("li","".join([node.to_html() for node in childNodes])))
             return ParentNode("ul",children)
         case BlockType.ORDERED_LIST:
             blockLines = block.split("\n")
             children=[]
-            subexpr=r"^[0-9]+\. "
-            for blockLine in blockLines:
-                cleanLine = re.sub(subexpr,"",blockLine).strip()
+            for i, blockLine in enumerate(blockLines):
+                cleanLine = ORDERED_LIST_ITEM.sub("",blockLine).strip()
                 childNodes = text_to_textnodes(cleanLine)
-                content = ""
-                for node in childNodes:
-                    content += node.to_html()
-                children.append(LeafNode("li",content))
+                collect_refs(childNodes, refs, i)
+                children.append(LeafNode("li","".join([node.to_html() for node in childNodes])))
             return ParentNode("ol",children)
 
-def markdown_to_html_node(md):
-    blocks = markdown_to_blocks(md)
-    nodes = [(get_node(block,block_to_block_type(block))) for block in blocks]
+DUMP_BLOCKS_ENV = "STATICSITE_DUMP_BLOCKS"
+
+def dump_blocks(nodes):
+    """
+    Debug hook: append the html of every block to the file named by $STATICSITE_DUMP_BLOCKS.
+    """
+    with open(os.environ[DUMP_BLOCKS_ENV], "a") as dumpfile:
+        # One write per page so parallel builds don't interleave inside a page.
+        dumpfile.write("".join(node.to_html() for node in nodes))
+
+class BlockMemo():
+    """
+    Bounded LRU of rendered block html (and the block's refs), keyed on the block text and its type.
+    Blocks repeated across pages (footers, disclaimers, snippets) are only parsed once.
+    """
+    def __init__(self, max_entries=4096, max_block=4096):
+        self.max_entries = max_entries
+        self.max_block = max_block  # Huge blocks are rarely repeated, don't pin them in memory.
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_node(self, block, blockType, refs=None):
+        """
+        The block's node, or a LeafNode of its html when it is memoized. The size of
+        the real node tree goes to the profiler's "nodes" counter either way.
+        """
+        if self.max_entries <= 0 or len(block) > self.max_block:
+            node = get_node(block, blockType, refs)
+            profiler.count("nodes", count_nodes(node))
+            return node
+        key = (blockType, block)
+        entry = self.entries.get(key)
+        if entry != None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            html, blockRefs, nodeCount = entry
+        else:
+            self.misses += 1
+            blockRefs = []
+            node = get_node(block, blockType, blockRefs)
+            nodeCount = count_nodes(node)
+            html = node.to_html()
+            self.entries[key] = (html, blockRefs, nodeCount)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        profiler.count("nodes", nodeCount)
+        if refs != None:
+            refs.extend(blockRefs)
+        return LeafNode(None, html)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+block_memo = BlockMemo()
+
+def set_block_memo_size(max_entries):
+    block_memo.max_entries = max_entries
+
+def count_nodes(node):
+    if isinstance(node, ParentNode):
+        return 1 + sum(count_nodes(child) for child in node.children)
+    return 1
+
+def profile_nodes(blocks, getNode, refs=None, countNodes=True):
+    """
+    Yield the block nodes of iter_block_nodes, timing block splitting (which includes
+    reading the file), classification and node building separately. countNodes is
+    off when getNode is a BlockMemo's, which counts the nodes it built itself.
+    """
+    timer = time.perf_counter
+    start = timer()
+    for block in blocks:
+        split = timer()
+        profiler.active.add_time("split blocks", split - start)
+        if block == "":
+            start = timer()
+            continue
+        blockType = block_to_block_type(block)
+        classified = timer()
+        profiler.active.add_time("classify blocks", classified - split)
+        node = getNode(block, blockType, refs)
+        start = timer()
+        profiler.active.add_time("build nodes", start - classified)
+        if countNodes:
+            profiler.count("nodes", count_nodes(node))
+        yield node
+        # What the consumer did with the node isn't splitting.
+        start = timer()
+    profiler.active.add_time("split blocks", timer() - start)
+
+def iter_block_nodes(md, memo=None, refs=None):
+    """
+    The block nodes of markdown_to_html_node, built one at a time as they are
+    asked for, so a page never has to be held as a whole. refs fills up as they go.
+    """
+    starts=[]
+    blocks = iter_blocks(md.split("\n") if isinstance(md, str) else md, starts)
+    getNode = memo.get_node if memo != None else get_node
+    if refs != None:
+        buildNode = getNode
+        def getNode(block, blockType, refs):
+            # Blocks report lines from their own start, which the memo can share across pages.
+            blockRefs=[]
+            node = buildNode(block, blockType, blockRefs)
+            start = starts[-1]
+            # Only the current block's start is needed, don't keep one per block.
+            starts.clear()
+            refs.extend((url, start + line) for url, line in blockRefs)
+            return node
+    if profiler.active != None:
+        return profile_nodes(blocks, getNode, refs, memo == None)
+    return (getNode(block,block_to_block_type(block),refs) for block in blocks if block != "")
+
+def markdown_to_html_node(md, on_blocks=None, memo=None, refs=None):
+    """
+    md is the markdown text, or an iterable of its lines to parse it as it is read.
+    on_blocks, if given, is called with the list of block nodes before they are
+    wrapped in the div. Setting $STATICSITE_DUMP_BLOCKS uses dump_blocks for it.
+    memo, a BlockMemo, makes repeated blocks come back as already rendered html.
+    refs, a list, collects the (url, line number) of the links and images on the page.
+    """
+    nodes = list(iter_block_nodes(md, memo, refs))
     div = ParentNode("div",nodes)
     #root = ParentNode("html",[body])
-    with open("test.html", 'w') as testfile:
-        for node in nodes:
-            testfile.write(node.to_html())
+    if on_blocks == None and DUMP_BLOCKS_ENV in os.environ:
+        on_blocks = dump_blocks
+    if on_blocks != None:
+        on_blocks(nodes)
     return div
 
-import os
-import shutil
-def copyFiles(src,dest):
-    files=os.listdir(src)
-    for file in files:
-        filePath=os.path.join(src,file)
-        print(filePath)
-        if os.path.isfile(filePath):
-            destPath = os.path.join(dest,file)
-            shutil.copy(filePath, destPath)
-        else:
-            newDest = os.path.join(dest,file)
-            os.makedirs(os.path.join(dest,file), exist_ok=True)
-            copyFiles(filePath,newDest)
+FICLONE = 0x40049409 # Linux ioctl to share a file's blocks copy-on-write (btrfs, xfs).
+STATIC_MODES = ["copy", "link", "reflink"]
+
+def sync_file(src, dest, mode="copy"):
+    """
+    Put a copy of src at dest. "link" hard links and "reflink" clones the
+    file's blocks, both fall back to a normal copy where the filesystem can't.
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if mode == "link":
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    elif mode == "reflink":
+        try:
+            import fcntl
+            with open(src, "rb") as fs, open(dest, "wb") as fd:
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+            shutil.copystat(src, dest)
+            return
+        except (ImportError, OSError):
+            pass
+    shutil.copy2(src, dest)
+
+def reuse_file(old, dest):
+    """
+    Put old, an unchanged output of the tree being replaced, at dest without
+    copying its data: hard linked, or cloned where links aren't allowed.
+    """
+    try:
+        os.link(old, dest)
+    except OSError:
+        sync_file(old, dest, "reflink")
+
+def previous_output(previous, key, signature, size=None):
+    """
+    The path of the output at key in the tree previous (a Manifest, or None) was
+    loaded from, when it was built from the same signature and is still there.
+    size, if given, is checked against the file too.
+    """
+    if previous == None:
+        return None
+    path = os.path.join(previous.root, key)
+    if not previous.is_current(path, signature):
+        return None
+    try:
+        if size != None and os.stat(path).st_size != size:
+            return None
+    except FileNotFoundError:
+        return None
+    return path if os.path.isfile(path) else None
+
+def copyFiles(src,dest,manifest=None,mode="copy",verbose=0):
+    copy_to_outputs(src, [(dest, manifest)], mode, verbose)
+
+def copy_to_outputs(src, outputs, mode="copy", verbose=0, compress=(), assets=None, url="/", previous=None):
+    """
+    Sync the src tree into every (dest, manifest) in outputs with a single walk,
+    each source file is only looked at once however many outputs there are.
+    Returns (source, gzip paths) for the files whose extension is in compress and
+    whose gzip siblings are out of date, see compress_static.
+    assets, a dict, turns on fingerprinting: files are written as name.<hash>.ext
+    and assets gets {url: fingerprinted url} for each of them. url is src's url.
+    previous, for a build into empty staging directories, holds the Manifest of
+    the live tree each output replaces (or None). Files and gzip siblings that
+    are unchanged there are linked over instead of copied, compressed or hashed,
+    unless that old file is the source itself, left by a "link" build.
+    """
+    previous = previous or [None] * len(outputs)
+    toCompress=[]
+    for dest, manifest in outputs:
+        os.makedirs(dest, exist_ok=True)
+    with os.scandir(src) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                toCompress.extend(copy_to_outputs(entry.path, [(os.path.join(dest,entry.name), manifest) for dest, manifest in outputs],
+                                                  mode, verbose, compress, assets, f"{url}{entry.name}/", previous))
+                continue
+            srcStat = entry.stat()
+            # Size and mtime stand in for a content hash so big assets are never read to be skipped.
+            signature = f"{srcStat.st_size}:{srcStat.st_mtime_ns}"
+            name = entry.name
+            if assets != None:
+                # The live tree's manifest knows the names, a fresh staging one doesn't.
+                name = fingerprinted_name(entry.path, signature, previous[0] or outputs[0][1])
+                assets[url + entry.name] = url + name
+            gzPaths=[]
+            for (dest, manifest), before in zip(outputs, previous):
+                destPath = os.path.join(dest,name)
+                gzPath = gzip_path(destPath, compress)
+                if gzPath != None and (manifest == None or not manifest.is_current(gzPath, signature)):
+                    if manifest != None:
+                        manifest.record(gzPath, manifest.key(destPath), signature)
+                    oldGz = previous_output(before, manifest.key(gzPath), signature) if manifest != None else None
+                    if oldGz != None:
+                        reuse_file(oldGz, gzPath)
+                    else:
+                        gzPaths.append(gzPath)
+                if manifest != None:
+                    if manifest.is_current(destPath, signature):
+                        continue
+                    manifest.record(destPath, entry.path, signature)
+                    # Linking the source costs the same as reusing, and an old output
+                    # linked to the source must not stay linked in the other modes.
+                    old = previous_output(before, manifest.key(destPath), signature, srcStat.st_size) if mode != "link" else None
+                    if old != None and not os.path.samefile(old, entry.path):
+                        reuse_file(old, destPath)
+                        continue
+                try:
+                    destStat = os.stat(destPath)
+                    if destStat.st_size == srcStat.st_size and destStat.st_mtime_ns == srcStat.st_mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    pass
+                if verbose > 0:
+                    print(entry.path)
+                sync_file(entry.path, destPath, mode)
+            if gzPaths:
+                toCompress.append((entry.path, gzPaths))
+    return toCompress
+
+FINGERPRINT_LENGTH = 10
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+
+def fingerprinted_name(path, signature, manifest=None):
+    """
+    The name.<hash>.ext file name of a fingerprinted asset. While the manifest has
+    the file under the same size and mtime, its name is reused and the file isn't read.
+    """
+    if manifest != None:
+        key = manifest.output_of(path)
+        if (key != None and manifest.entries[key]["source_hash"] == signature
+                and os.path.basename(key) != os.path.basename(path)):
+            return os.path.basename(key)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}.{hash_file(path)[:FINGERPRINT_LENGTH]}{ext}"
+
+def write_asset_manifest(root, assets, manifest=None, src="static"):
+    """
+    Write the {url: fingerprinted url} table next to the outputs, for servers and
+    scripts. It is recorded as an output of src, so it goes once fingerprinting stops.
+    """
+    path = os.path.join(root, ASSET_MANIFEST_NAME)
+    with open(path, "w") as fp:
+        json.dump(assets, fp, indent=1, sort_keys=True)
+    if manifest != None:
+        manifest.record(path, src, hash_file(path))
+
+def gzip_path(path, compress):
+    """
+    The path of an output's gzip sibling, or None when its extension isn't in compress.
+    """
+    if os.path.splitext(path)[1].lstrip(".") in compress:
+        return path + ".gz"
+    return None
+
+def output_mode():
+    # mkstemp files are private, outputs get the mode open() would have given them.
+    mask = os.umask(0)
+    os.umask(mask)
+    return 0o666 & ~mask
+
+OUTPUT_MODE = output_mode()
+
+def open_temp(path, mode, temps, encoding=None):
+    """
+    Open a new temporary file next to path, adding (temporary path, path) to temps.
+    """
+    fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    temps.append((tmpPath, path))
+    os.fchmod(fd, OUTPUT_MODE)
+    return os.fdopen(fd, mode, encoding=encoding)
+
+@contextmanager
+def open_output(dest_path, compress=()):
+    """
+    Open dest_path and yield the function that writes a text chunk to it. When its
+    extension is in compress, the gzip sibling is made from the same chunks as
+    they go by, the page isn't read back. Both are written to temporary files
+    that only replace the outputs once the page is complete, so a page that fails
+    halfway leaves the last good one in place.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    gzPath = gzip_path(dest_path, compress)
+    temps=[]
+    try:
+        # The encoding open() would use, named so the gzip sibling can use it too.
+        with open_temp(dest_path, "w", temps, locale.getpreferredencoding(False)) as dp:
+            if gzPath == None:
+                yield dp.write
+            else:
+                # No name or time in the header, so unchanged pages compress to the same bytes.
+                with open_temp(gzPath, "wb", temps) as raw, gzip.GzipFile("", "wb", fileobj=raw, mtime=0) as gz:
+                    def write(chunk):
+                        dp.write(chunk)
+                        gz.write(chunk.encode(dp.encoding))
+                    yield write
+        for tmpPath, path in temps:
+            os.replace(tmpPath, path)
+    except BaseException:
+        for tmpPath, path in temps:
+            try:
+                os.remove(tmpPath)
+            except FileNotFoundError:
+                pass
+        raise
+
+def write_output(dest_path, chunks, compress=()):
+    """
+    Write text chunks to dest_path, and its gzip sibling as open_output does.
+    """
+    with open_output(dest_path, compress) as write:
+        for chunk in chunks:
+            write(chunk)
+
+def gzip_copies(src, dests):
+    """
+    Compress the file src once and write the result to every path in dests.
+    """
+    with open(src, "rb") as fp:
+        data = gzip.compress(fp.read(), mtime=0)
+    for dest in dests:
+        with open(dest, "wb") as fp:
+            fp.write(data)
+
+def compress_static(jobs, threads=None):
+    """
+    Run the (source, gzip paths) jobs from copy_to_outputs on a thread per core,
+    zlib lets go of the GIL while it compresses.
+    """
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+        list(pool.map(lambda job: gzip_copies(*job), jobs))
 
 def extract_title(md):
     startTitle = md.find("# ")
@@ -227,56 +714,664 @@ def extract_title(md):
     title = title.lstrip("#").strip()
     return title
 
-def generate_page(from_path, template_path, dest_path, basepath):
+def find_title(lines):
+    """
+    The title from the first of lines that holds a "# ", read no further than that.
+    """
+    for line in lines:
+        if "# " in line:
+            return extract_title(line[line.find("# "):])
+    raise Exception("No title find in markdown file.")
+
+class Rereadable():
+    """
+    Iterable that starts over each time it is iterated, from a function returning
+    a fresh iterator, so a file can be gone through twice without holding it.
+    """
+    __slots__ = ("start",)
+
+    def __init__(self, start):
+        self.start = start
+
+    def __iter__(self):
+        return self.start()
+
+def rewound(fp):
+    fp.seek(0)
+    return iter(fp)
+
+# Markdown files from this size up are memory-mapped instead of read through a file object.
+MMAP_THRESHOLD = 1 << 20
+
+def iter_mapped_lines(buffer, encoding="utf-8", window=1 << 16):
+    """
+    Yield the lines of a memory-mapped file. The mapping is decoded a window of
+    about `window` bytes at a time, cut at a newline, so the file is never held
+    in memory as one string.
+    """
+    start = 0
+    end = len(buffer)
+    while start < end:
+        stop = end
+        if start + window < end:
+            newline = buffer.find(b"\n", start + window)
+            if newline != -1:
+                stop = newline + 1
+        text = buffer[start:stop].decode(encoding)
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        yield from lines
+        start = stop
+
+def should_map(path):
+    # Empty files can't be mapped.
+    return os.path.getsize(path) >= max(MMAP_THRESHOLD, 1)
+
+def map_markdown(path, advice=None):
+    """
+    Memory-map a markdown file read only. advice, an mmap.MADV_* name, is passed
+    on to the kernel where the platform has it.
+    """
+    with open(path, "rb") as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    if advice != None and hasattr(mmap, advice):
+        buffer.madvise(getattr(mmap, advice))
+    return buffer
+
+@contextmanager
+def open_markdown(path):
+    """
+    Open a markdown file as an iterable of lines for parse_page, read from the top
+    each time it is iterated. Files of MMAP_THRESHOLD bytes and up are mapped and
+    decoded a window at a time.
+    """
+    if not should_map(path):
+        with open(path, "r") as fp:
+            yield Rereadable(lambda: rewound(fp))
+        return
+    with map_markdown(path, "MADV_SEQUENTIAL") as buffer:
+        # Decoded the way open() would have.
+        yield Rereadable(lambda: iter_mapped_lines(buffer, locale.getpreferredencoding(False)))
+
+# What building a page reports back: its block memo hits and misses, and the urls it links to.
+PageInfo = namedtuple("PageInfo", ["hits", "misses", "refs"])
+
+def parse_page(lines, cache=None, key=None):
+    """
+    Parse a page from its markdown lines, which have to be iterable twice: once
+    for the title, which templates need before the content, and once to parse.
+    Returns (title, content chunks, page_info). Blocks are parsed as the chunks
+    are consumed, so only one is in memory at a time, and page_info() gives the
+    page's PageInfo after parsing whatever was not consumed, while lines are still
+    open. With a cache, the content is stored
+    under key on the way through.
+    """
+    title = find_title(lines)
+    refs=[]
+    counts=[]
+    def iterContent():
+        hits, misses = block_memo.hits, block_memo.misses
+        nodes = iter_block_nodes(lines, memo=block_memo, refs=refs)
+        if DUMP_BLOCKS_ENV in os.environ:
+            nodes = list(nodes)
+            dump_blocks(nodes)
+        # The div's children are only gone through once, as they are serialized.
+        yield from ParentNode("div", nodes).iter_html()
+        counts.extend((block_memo.hits - hits, block_memo.misses - misses))
+    content = iterContent()
+    if cache != None:
+        content = cache.put(key, title, content, refs)
+    def page_info():
+        # A template without the content slot never asks for it, the page is
+        # still parsed so its refs and cache entry are complete.
+        for chunk in content:
+            pass
+        return PageInfo(counts[0], counts[1], refs)
+    return title, content, page_info
+
+def lookup_page(from_path, cache):
+    """
+    Returns the page's cache key and its cached (title, refs, content chunks), or None.
+    """
+    key = cache.key(hash_file(from_path))
+    return key, cache.get(key)
+
+@contextmanager
+def open_page(from_path, cache=None, read=None):
+    """
+    Open the page at from_path and yield it as (title, content chunks, page_info),
+    see parse_page, from the cache when it has the page. read, what read_page
+    returned for the page, is used instead of looking it up and opening it here.
+    """
+    key, cached, text = read if read != None else (None, None, None)
+    if read == None and cache != None:
+        with profiler.stage("cache lookup"):
+            key, cached = lookup_page(from_path, cache)
+    if cached != None:
+        # Unchanged markdown, only the templating has to run.
+        title, refs, content = cached
+        yield title, content, lambda: PageInfo(0, 0, refs)
+    elif text == None:
+        with open_markdown(from_path) as lines:
+            yield parse_page(lines, cache, key)
+    elif isinstance(text, str):
+        yield parse_page(text.split("\n"), cache, key)
+    else:
+        with text:
+            yield parse_page(Rereadable(lambda: iter_mapped_lines(text, locale.getpreferredencoding(False))), cache, key)
+
+def render_page(from_path, sinks, cache=None, read=None):
+    """
+    Render the page at from_path through every (template, write) in sinks, where
+    write takes one text chunk. Every build path goes through here, profiling
+    wraps it from outside (see profile_page). The page is parsed block by block
+    as the sinks are written, with several sinks in step, so tee only keeps the
+    few chunks they are apart. Returns the page's PageInfo.
+    """
+    with open_page(from_path, cache, read) as (title, content, page_info):
+        if profiler.active != None:
+            content = profiler.timed_iter("parse", content)
+        title = escape_text(title)
+        streams = itertools.tee(content, len(sinks)) if len(sinks) > 1 else [content]
+        renders = [template.iter_render(Title=title, Content=stream) for (template, write), stream in zip(sinks, streams)]
+        if profiler.active != None:
+            # Serializing pulls the content, so it takes in the parse, as a page takes in both.
+            renders = [profiler.timed_iter("serialize", render) for render in renders]
+        for chunks in itertools.zip_longest(*renders):
+            for (template, write), chunk in zip(sinks, chunks):
+                if chunk != None:
+                    write(chunk)
+        return page_info()
+
+def write_page(from_path, outputs, cache=None, compress=()):
+    """
+    Render the page at from_path into every (template, dest path) in outputs.
+    compress, a set of extensions, also writes a gzip sibling when the page's is
+    among them. Returns the page's PageInfo.
+    """
+    with ExitStack() as stack:
+        sinks = [(template, profiler.timed_calls("write", stack.enter_context(open_output(dest_path, compress))))
+                 for template, dest_path in outputs]
+        return render_page(from_path, sinks, cache)
+
+def profile_page(from_path, dest_paths, build):
+    """
+    Run build(), which builds the page at from_path into dest_paths, as the page's
+    profiler stage and record it. Returns what build returned.
+    """
+    start = time.perf_counter()
+    with profiler.stage("page", path=from_path):
+        result = build()
+    record_page_profile(from_path, dest_paths, time.perf_counter() - start)
+    return result
+
+def record_page_profile(from_path, dest_paths, seconds):
+    """
+    Record a built page with the profiler: its time, the bytes read and written
+    and one page per output.
+    """
+    profiler.active.page(from_path, seconds)
+    profiler.count("bytes read", os.path.getsize(from_path))
+    for dest_path in dest_paths:
+        profiler.count("bytes written", os.path.getsize(dest_path))
+        profiler.count("pages")
+
+def build_page(from_path, outputs, cache=None, compress=()):
+    """
+    write_page, profiled when the build is.
+    """
+    if profiler.active == None:
+        return write_page(from_path, outputs, cache, compress)
+    return profile_page(from_path, [dest_path for template, dest_path in outputs],
+                        lambda: write_page(from_path, outputs, cache, compress))
+
+def generate_page(from_path, template_path, dest_path, basepath, template=None, cache=None, compress=()):
+    """
+    Returns the page's PageInfo. compress, a set of extensions, also writes a
+    gzip sibling when the page's is among them.
+    """
     print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    fmd=""
-    with open(from_path,"r") as fp:
-        fmd=fp.read()
-    tmd=""
-    with open(template_path,"r") as tp:
-        tmd=tp.read()
-    fhtml=markdown_to_html_node(fmd).to_html()
-    title = extract_title(fmd)
-    tmd = tmd.replace("{{ Title }}", title)
-    tmd = tmd.replace("{{ Content }}", fhtml)
-    tmd = tmd.replace("href=\"/", f"href=\"{basepath}")
-    tmd = tmd.replace("src=\"/", f"src=\"{basepath}")
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with open(dest_path, "w") as dp:
-        dp.write(tmd)
-    
-def generate_pages_recursive(dir_content, temp_path, dest_path, basepath):
+    # Callers building many pages should pass the compiled template in.
+    if template == None:
+        with profiler.stage("read template"):
+            template = Template.load(template_path, basepath)
+    return build_page(from_path, [(template, dest_path)], cache, compress)
+
+def profile_task(task, *args):
+    """
+    Run a page task in a pool worker while the build is profiled, returns the
+    worker's profile along with the task's result.
+    """
+    profiler.enable()
+    result = task(*args)
+    return result, profiler.disable().export()
+
+def read_page(from_path, cache=None):
+    """
+    I/O half of a pipelined page, what render_page takes as read. Returns (cache
+    key, cached (title, refs, content chunks) or None, markdown or None when cached).
+    Big markdown files come back mapped instead of read, with the kernel asked to
+    load them in the background, so they never sit in memory as one string.
+    """
+    key = None
+    with profiler.stage("read", path=from_path):
+        if cache != None:
+            key, cached = lookup_page(from_path, cache)
+            if cached != None:
+                return key, cached, None
+        if should_map(from_path):
+            return key, None, map_markdown(from_path, "MADV_WILLNEED")
+        with open(from_path,"r") as fp:
+            return key, None, fp.read()
+
+def write_chunks(dest_path, chunks, compress=()):
+    with profiler.stage("write", path=dest_path):
+        write_output(dest_path, chunks, compress)
+
+def timed_call(fn, *args):
+    """
+    fn(*args) and the seconds it took, for work handed to a thread.
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def generate_pages_pipelined(pages, temp_path, basepath, template, cache=None, io_threads=4, compress=()):
+    """
+    Build pages with reads and writes on I/O threads, so rendering in this thread
+    overlaps with the disk. At most 2*io_threads reads and 2*io_threads writes are
+    in flight, which bounds memory however big the tree is.
+    Returns the PageInfo of every page, in order. When profiling, a page's time
+    is its read, render and write added up, whichever threads they ran on.
+    """
+    stats=[]
+    depth = io_threads * 2
+    pending = iter(pages)
+    reads = deque()
+    writes = deque()
+    with ThreadPoolExecutor(max_workers=io_threads) as readers, ThreadPoolExecutor(max_workers=io_threads) as writers:
+        def readAhead():
+            while len(reads) < depth:
+                page = next(pending, None)
+                if page == None:
+                    return
+                reads.append((page, readers.submit(timed_call, read_page, page[0], cache)))
+        def finishWrite():
+            contSrc, contDest, seconds, write = writes.popleft()
+            seconds += write.result()[1]
+            if profiler.active != None:
+                record_page_profile(contSrc, [contDest], seconds)
+        readAhead()
+        while reads:
+            (contSrc, contDest), read = reads.popleft()
+            readAhead()
+            print(f"Generating page from {contSrc} to {contDest} using {temp_path}")
+            read, readSeconds = read.result()
+            start = time.perf_counter()
+            # The page goes to a writer thread whole, so it is rendered into a list.
+            chunks=[]
+            with profiler.stage("page", path=contSrc):
+                stats.append(render_page(contSrc, [(template, chunks.append)], cache, read))
+            seconds = readSeconds + time.perf_counter() - start
+            # Backpressure: wait for the oldest write before queueing another.
+            while len(writes) >= depth:
+                finishWrite()
+            writes.append((contSrc, contDest, seconds, writers.submit(timed_call, write_chunks, contDest, chunks, compress)))
+        while writes:
+            finishWrite()
+    return stats
+
+def find_pages(dir_content, dest_path):
+    """
+    Walk the content tree once and return a list of (markdown path, html path) pairs.
+    """
+    pages=[]
     files = os.listdir(dir_content)
     for file in files:
         
         if os.path.isfile(os.path.join(dir_content,file)):
             if file.endswith(".md"):
                 contSrc = os.path.join(dir_content,file)
-                contDest = os.path.join(dest_path,file)
-                generate_page(contSrc, temp_path, contDest.replace(".md",".html"), basepath)
+                contDest = os.path.join(dest_path,file).replace(".md",".html")
+                pages.append((contSrc, contDest))
         else:
             nextContent = os.path.join(dir_content,file)
             nextDest = os.path.join(dest_path,file)
-            generate_pages_recursive(nextContent,temp_path, nextDest.replace(".md",".html"), basepath)
-
-def main(basepath):
-    rmdir = os.path.abspath("docs/")
-    if os.path.exists(rmdir):
-        cont=input(f"Remove directory {rmdir} (y/n)? ")
-        if cont.upper() == "Y":
-            shutil.rmtree("docs/")
-        else:
-            print("Must remove docs directory to continue.")
-            return 0
-    print("Copying files...")
-    copyFiles("static","docs")
-    generate_pages_recursive("content","template.html","docs",basepath)
+            pages.extend(find_pages(nextContent, nextDest.replace(".md",".html")))
+    return pages
+
+def template_hash(manifest, temp_path, assets=None):
+    """
+    What pages compare their template by: the template file's hash, and with
+    fingerprinted assets also the names the template's own urls are rewritten to.
+    """
+    tempHash = manifest.file_hash(temp_path)
+    if assets == None:
+        return tempHash
+    with open(temp_path, "r") as tp:
+        names = sorted(f"{url}={assets[url]}" for url, line in find_refs(tp.read()) if url in assets)
+    return hashlib.sha256("\n".join([tempHash] + names).encode()).hexdigest()
+
+def page_stale_reason(manifest, contDest, srcHash, tempHash, basepath, compress=()):
+    """
+    Why a page's output, or its gzip sibling, has to be built, or None if neither does.
+    """
+    reason = manifest.stale_reason(contDest, srcHash, tempHash, basepath)
+    gzDest = gzip_path(contDest, compress)
+    if reason == None and gzDest != None and not manifest.is_current(gzDest, srcHash, tempHash, basepath):
+        reason = "gzip copy out of date"
+    return reason
+
+def record_page(manifest, contDest, contSrc, srcHash, temp_path, tempHash, basepath, compress=()):
+    manifest.record(contDest, contSrc, srcHash, tempHash, basepath, temp_path)
+    gzDest = gzip_path(contDest, compress)
+    if gzDest != None:
+        manifest.record(gzDest, manifest.key(contDest), srcHash, tempHash, basepath, temp_path)
+
+def generate_pages_recursive(dir_content, temp_path, dest_path, basepath, manifest=None, jobs=1, cache=None, io_threads=0, explain=False, compress=(), assets=None):
+    """
+    With a manifest, only pages whose inputs changed are built: the markdown, the
+    template, the basepath or a local asset the page links to. explain prints why.
+    compress is the set of extensions that also get a gzip sibling. assets is the
+    fingerprinted url table from copy_to_outputs that page urls are rewritten through.
+    """
+    pages=[]
+    with profiler.stage("walk content"):
+        found = find_pages(dir_content, dest_path)
+    with profiler.stage("check manifest"):
+        # The template is the same for every page, hash it once.
+        tempHash = template_hash(manifest, temp_path, assets) if manifest != None else None
+        for contSrc, contDest in found:
+            if manifest != None:
+                srcHash = hash_file(contSrc)
+                reason = page_stale_reason(manifest, contDest, srcHash, tempHash, basepath, compress)
+                if reason == None:
+                    continue
+                if explain:
+                    print(f"Rebuilding {contDest}: {reason}")
+                record_page(manifest, contDest, contSrc, srcHash, temp_path, tempHash, basepath, compress)
+            pages.append((contSrc, contDest))
+
+    with profiler.stage("read template"):
+        template = Template.load(temp_path, basepath, assets)
+    stats=[]
+    if jobs > 1 and len(pages) > 1:
+        # Pages are independent, so render them on a process pool. Each worker
+        # writes its own file, the output is the same as a serial build.
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_block_memo_size, initargs=(block_memo.max_entries,)) as pool:
+            stats = run_on_pool(pool, generate_page, [(contSrc, temp_path, contDest, basepath, template, cache, compress) for contSrc, contDest in pages])
+    elif io_threads > 0:
+        stats = generate_pages_pipelined(pages, temp_path, basepath, template, cache, io_threads, compress)
+    else:
+        for contSrc, contDest in pages:
+            stats.append(generate_page(contSrc, temp_path, contDest, basepath, template, cache, compress))
+    if manifest != None:
+        for (contSrc, contDest), info in zip(pages, stats):
+            manifest.set_refs(contDest, info.refs)
+    # Block memo (hits, misses) over the pages built.
+    return (sum(stat[0] for stat in stats), sum(stat[1] for stat in stats))
+
+def run_on_pool(pool, task, calls):
+    """
+    Submit task(*args) for every args in calls and return the results in order,
+    merging the workers' profiles when the build is profiled.
+    """
+    if profiler.active == None:
+        futures = [pool.submit(task, *args) for args in calls]
+        return [future.result() for future in futures]
+    futures = [pool.submit(profile_task, task, *args) for args in calls]
+    results=[]
+    for future in futures:
+        result, profile = future.result()
+        profiler.active.merge(profile)
+        results.append(result)
+    return results
+
+def parse_extensions(text):
+    return {ext.strip().lstrip(".") for ext in text.split(",") if ext.strip()}
+
+# One output of a multi-target build: its directory, basepath and template.
+BuildTarget = namedtuple("BuildTarget", ["out_dir", "basepath", "template_path"])
+
+def parse_target(text):
+    """
+    Parse a --target value, OUT_DIR[,BASEPATH[,TEMPLATE]]. Missing parts are None.
+    """
+    parts = text.split(",")
+    if len(parts) > 3 or not parts[0]:
+        raise ValueError(f"Expected OUT_DIR[,BASEPATH[,TEMPLATE]], got {text}")
+    parts += [None] * (3 - len(parts))
+    return BuildTarget(*[part or None for part in parts])
+
+def generate_page_fanout(from_path, outputs, cache=None, compress=()):
+    """
+    Parse a page once and write it through every (template, dest path) in outputs.
+    Returns the page's PageInfo.
+    """
+    for template, dest_path in outputs:
+        print(f"Generating page from {from_path} to {dest_path}")
+    return build_page(from_path, outputs, cache, compress)
+
+def generate_pages_fanout(dir_content, targets, manifests, jobs=1, cache=None, explain=False, compress=(), assets=None):
+    """
+    Build the content tree into several targets (BuildTarget) with one walk, parsing
+    each page once and writing it into every target whose copy is out of date.
+    manifests holds each target's Manifest, or None to always build.
+    Returns the block memo (hits, misses) over the pages parsed.
+    """
+    with profiler.stage("walk content"):
+        found = find_pages(dir_content, "")
+    with profiler.stage("read template"):
+        templates = [Template.load(target.template_path, target.basepath, assets) for target in targets]
+    pages=[]
+    with profiler.stage("check manifest"):
+        tempHashes = [template_hash(manifest, target.template_path, assets) if manifest != None else None
+                      for target, manifest in zip(targets, manifests)]
+        for contSrc, relDest in found:
+            srcHash = None
+            outputs=[]
+            recorded=[]
+            for target, template, manifest, tempHash in zip(targets, templates, manifests, tempHashes):
+                contDest = os.path.join(target.out_dir, relDest)
+                if manifest != None:
+                    if srcHash == None:
+                        srcHash = hash_file(contSrc)
+                    reason = page_stale_reason(manifest, contDest, srcHash, tempHash, target.basepath, compress)
+                    if reason == None:
+                        continue
+                    if explain:
+                        print(f"Rebuilding {contDest}: {reason}")
+                    record_page(manifest, contDest, contSrc, srcHash, target.template_path, tempHash, target.basepath, compress)
+                    recorded.append((manifest, contDest))
+                outputs.append((template, contDest))
+            if outputs:
+                pages.append((contSrc, outputs, recorded))
+
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_block_memo_size, initargs=(block_memo.max_entries,)) as pool:
+            stats = run_on_pool(pool, generate_page_fanout, [(contSrc, outputs, cache, compress) for contSrc, outputs, recorded in pages])
+    else:
+        stats = [generate_page_fanout(contSrc, outputs, cache, compress) for contSrc, outputs, recorded in pages]
+    for (contSrc, outputs, recorded), info in zip(pages, stats):
+        for manifest, contDest in recorded:
+            manifest.set_refs(contDest, info.refs)
+    return (sum(info.hits for info in stats), sum(info.misses for info in stats))
+
+def check_links(manifest, temp_path):
+    """
+    Check the links and images of every page, and the href and src attributes of
+    the template, against the outputs recorded in the manifest. Uses what was
+    collected while the pages were parsed, nothing is read again but the template.
+    Returns (source, line, url) for every site-absolute url that doesn't resolve.
+    """
+    broken = manifest.broken_refs()
+    with open(temp_path, "r") as tp:
+        for url, line in find_refs(tp.read()):
+            if url_path(url) != None and manifest.resolve(url) == None:
+                broken.append((temp_path, line, url))
+    return broken
+
+def swap_dir(staging, dest):
+    """
+    Replace dest with the finished staging directory. Both live in the same
+    parent so the renames never copy, and dest is only missing between them.
+    """
+    old = None
+    if os.path.exists(dest):
+        old = tempfile.mkdtemp(prefix=f".{os.path.basename(dest)}-old-", dir=os.path.dirname(os.path.abspath(dest)))
+        os.rmdir(old)
+        os.rename(dest, old)
+    os.rename(staging, dest)
+    if old != None:
+        shutil.rmtree(old)
+
+def main(basepath, incremental=False, jobs=1, force=False, static_mode="copy", verbose=0, cache=None,
+         profile=None, profile_top=10, io_threads=0, explain=False, strict_links=False, targets=None, compress=(),
+         fingerprint=False):
+    """
+    profile, a file name, turns on build profiling: a summary is printed at the
+    end and a Chrome trace-event file is written to it. explain prints why each
+    page is rebuilt. Broken internal links are always reported, strict_links
+    fails the build over them. targets, a list of BuildTarget, builds into each
+    of them in one pass instead of into docs/ alone. compress is the set of
+    extensions whose outputs get a precompressed .gz sibling. fingerprint writes
+    static files as name.<hash>.ext and points every href and src at those names.
+    """
+    if targets == None:
+        targets = [BuildTarget("docs", basepath, "template.html")]
+    for target in targets:
+        outDir = target.out_dir
+        if not incremental and os.path.exists(outDir) and not force:
+            if not sys.stdin.isatty():
+                print(f"{os.path.abspath(outDir)} exists, pass --yes to replace it.")
+                return 1
+            cont=input(f"Replace directory {os.path.abspath(outDir)} (y/n)? ")
+            if cont.upper() != "Y":
+                print(f"Must replace {outDir} directory to continue.")
+                return 1
+    if profile != None:
+        profiler.enable()
+    buildDirs=[]
+    manifests=[]
+    previous=[]     # The live trees' manifests, unchanged static files are linked over from them.
+    try:
+        for target in targets:
+            outDir = target.out_dir
+            if incremental:
+                # Keep the output and only rebuild what changed since the last build.
+                manifests.append(Manifest.load(outDir))
+                buildDirs.append(outDir)
+            else:
+                # Build next to the output and swap it in at the end, so it is never half written.
+                parent = os.path.dirname(os.path.abspath(outDir))
+                os.makedirs(parent, exist_ok=True)
+                buildDirs.append(tempfile.mkdtemp(prefix=f".{os.path.basename(outDir)}-staging-", dir=parent))
+                manifests.append(Manifest(buildDirs[-1]))
+                previous.append(Manifest.load(outDir))
+        print("Copying files...")
+        assets = {} if fingerprint else None
+        with profiler.stage("copy static"):
+            toCompress = copy_to_outputs("static", list(zip(buildDirs, manifests)), static_mode, verbose, compress, assets, previous=previous)
+        if assets != None:
+            for buildDir, manifest in zip(buildDirs, manifests):
+                manifest.aliases = {url_path(url): url_path(name) for url, name in assets.items()}
+                write_asset_manifest(buildDir, assets, manifest)
+        with profiler.stage("compress static"):
+            compress_static(toCompress)
+        with profiler.stage("generate pages"):
+            if len(targets) == 1:
+                hits, misses = generate_pages_recursive("content", targets[0].template_path, buildDirs[0], targets[0].basepath,
+                                                        manifest=manifests[0], jobs=jobs, cache=cache, io_threads=io_threads,
+                                                        explain=explain, compress=compress, assets=assets)
+            else:
+                building = [target._replace(out_dir=buildDir) for target, buildDir in zip(targets, buildDirs)]
+                hits, misses = generate_pages_fanout("content", building, manifests, jobs=jobs, cache=cache,
+                                                     explain=explain, compress=compress, assets=assets)
+        if hits + misses > 0:
+            print(f"Block memo: {hits} hits, {misses} misses ({hits * 100 / (hits + misses):.1f}% reused)")
+        broken=[]
+        for target, manifest in zip(targets, manifests):
+            for removed in manifest.prune():
+                print(f"Removed stale output {removed}")
+            manifest.save()
+            with profiler.stage("check links"):
+                broken.extend(check_links(manifest, target.template_path))
+        # Every target is built from the same pages, report each broken link once.
+        broken = sorted(set(broken))
+        for source, line, url in broken:
+            print(f"{source}:{line}: broken link {url}")
+        if broken and strict_links:
+            raise SystemExit(f"Found {len(broken)} broken link(s).")
+    except BaseException:
+        profiler.disable()
+        for target, buildDir in zip(targets, buildDirs):
+            if buildDir != target.out_dir:
+                shutil.rmtree(buildDir, ignore_errors=True)
+        raise
+    for target, buildDir in zip(targets, buildDirs):
+        if buildDir != target.out_dir:
+            os.chmod(buildDir, 0o755)   # mkdtemp makes it private.
+            swap_dir(buildDir, target.out_dir)
+    if profile != None:
+        built = profiler.disable()
+        print(built.report(profile_top))
+        built.write_trace(profile)
+        print(f"Wrote trace to {profile}")
+    return 0
     #tn = textnode.TextNode("aaa",textnode.TextType.TEXT,"")
     #text_to_textnodes("This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)")
 
 if __name__=="__main__":
-    import sys
-    basepath="/"
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-    main(basepath)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the site from content/ and static/ into docs/.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild outputs whose inputs changed since the last build")
+    parser.add_argument("-y", "--yes", "--force", dest="force", action="store_true",
+                        help="replace docs/ without asking")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes rendering pages, 0 for one per CPU (default 1)")
+    parser.add_argument("--static-mode", choices=STATIC_MODES, default="copy",
+                        help="how static/ files get into docs/: copy, hard link or copy-on-write clone")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="print every static file as it is synced")
+    parser.add_argument("--target", action="append", type=parse_target, metavar="OUT_DIR[,BASEPATH[,TEMPLATE]]",
+                        help="build into this directory instead of docs/, repeat it to build several targets "
+                             "from one parse of the content (basepath and template default to the usual ones)")
+    parser.add_argument("--gzip", type=parse_extensions, default=(), metavar="EXTS",
+                        help="also write a .gz of every output with one of these extensions, e.g. html,css,js,svg")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="name static files name.<hash>.ext and rewrite links to them, for far-future caching")
+    parser.add_argument("--explain", action="store_true",
+                        help="print why each page is rebuilt, most useful with --incremental")
+    parser.add_argument("--strict-links", action="store_true",
+                        help="fail the build if a page or the template links to a missing page or file")
+    parser.add_argument("--io-threads", type=int, default=0, metavar="N",
+                        help="with --jobs 1 and a single target, read and write pages on N threads while rendering "
+                             "(default off, can't be combined with several --target)")
+    parser.add_argument("--memo-size", type=int, default=block_memo.max_entries, metavar="N",
+                        help="rendered blocks kept in memory for reuse across pages, 0 to turn off")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="keep rendered page content in DIR and reuse it while the markdown is unchanged")
+    parser.add_argument("--cache-size", type=int, default=256, metavar="MB",
+                        help="size cap of the --cache directory (default 256)")
+    parser.add_argument("--profile", metavar="TRACE",
+                        help="time every build stage and page, print a summary and write a Chrome trace to TRACE")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="slowest pages listed in the --profile summary (default 10)")
+    args = parser.parse_args()
+    if args.io_threads > 0 and args.target and len(args.target) > 1:
+        parser.error("--io-threads can't be combined with several --target")
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    targets = None
+    if args.target:
+        targets = [BuildTarget(target.out_dir, target.basepath or args.basepath, target.template_path or "template.html")
+                   for target in args.target]
+    set_block_memo_size(args.memo_size)
+    sys.exit(main(args.basepath, incremental=args.incremental, jobs=jobs, force=args.force,
+                  static_mode=args.static_mode, verbose=args.verbose,
+                  cache=RenderCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None,
+                  profile=args.profile, profile_top=args.profile_top, io_threads=args.io_threads,
+                  explain=args.explain, strict_links=args.strict_links, targets=targets,
+                  compress=args.gzip, fingerprint=args.fingerprint))
\ No newline at end of file
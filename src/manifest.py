@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".manifest.json"
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def url_path(url):
+    """
+    The output path, relative to the output root, that a site-absolute url names,
+    or None for external and relative urls.
+    """
+    if not url.startswith("/") or url.startswith("//"):
+        return None
+    path = url.split("#", 1)[0].split("?", 1)[0].strip("/")
+    return os.path.normpath(path) if path else ""
+
+class Manifest():
+    """
+    Record of what every output file was built from, kept in the output directory.
+    Each entry is keyed by the output path (relative to the root) and holds the
+    source path, source hash, template path and hash and basepath used to build it.
+    Pages also keep the urls they link to and the signatures of the local assets
+    among them, which together make up the build's dependency graph.
+    """
+    def __init__(self, root, entries=None):
+        self.root = root
+        self.entries = entries if entries != None else {}
+        self.seen = set()
+        self.hashes = {}
+        self.aliases = {}   # url path -> output key, for fingerprinted assets
+        # Source -> output key as loaded, before this build records anything.
+        self.sources = {entry["source"]: key for key, entry in self.entries.items()}
+
+    @classmethod
+    def load(cls, root):
+        path = os.path.join(root, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls(root)
+        with open(path, "r") as fp:
+            return cls(root, json.load(fp))
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, MANIFEST_NAME), "w") as fp:
+            json.dump(self.entries, fp, indent=1, sort_keys=True)
+
+    def key(self, dest_path):
+        return os.path.relpath(dest_path, self.root)
+
+    def file_hash(self, path):
+        # The template is an input to every page, only hash it once per build.
+        if path not in self.hashes:
+            self.hashes[path] = hash_file(path)
+        return self.hashes[path]
+
+    def stale_reason(self, dest_path, source_hash, template_hash=None, basepath=None):
+        """
+        Return why the output has to be rebuilt, or None if it is up to date.
+        """
+        key = self.key(dest_path)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry == None:
+            return "new output"
+        if not os.path.exists(dest_path):
+            return "output missing"
+        if entry["source_hash"] != source_hash:
+            return "source changed"
+        if entry["template_hash"] != template_hash:
+            return "template changed"
+        if entry["basepath"] != basepath:
+            return "basepath changed"
+        for url, signature in entry.get("assets", {}).items():
+            if self.asset_signature(url) != signature:
+                return f"referenced asset changed: {url}"
+        return None
+
+    def is_current(self, dest_path, source_hash, template_hash=None, basepath=None):
+        return self.stale_reason(dest_path, source_hash, template_hash, basepath) == None
+
+    def record(self, dest_path, source, source_hash, template_hash=None, basepath=None, template=None):
+        key = self.key(dest_path)
+        self.seen.add(key)
+        self.entries[key] = {
+            "source": source,
+            "source_hash": source_hash,
+            "template": template,
+            "template_hash": template_hash,
+            "basepath": basepath,
+        }
+
+    def output_key(self, url):
+        """
+        The key a site-absolute url's output would have, through aliases. None for other urls.
+        """
+        path = url_path(url)
+        return self.aliases.get(path, path) if path != None else None
+
+    def output_of(self, source):
+        """
+        The key of the output source had before this build, or None.
+        """
+        return self.sources.get(source)
+
+    def resolve(self, url):
+        """
+        Return the key of the output a site-absolute url is served from, or None
+        if there is no such output. /blog/tom finds blog/tom/index.html.
+        """
+        path = self.output_key(url)
+        if path == None:
+            return None
+        for candidate in (path, os.path.join(path, "index.html"), path + ".html"):
+            if candidate in self.entries:
+                return candidate
+        return None
+
+    def asset_signature(self, url):
+        """
+        The recorded signature of the static file a site-absolute url points at, or
+        None if the url is not a file this build copied. Pages have a template and
+        are not assets, whether or not they were recorded yet this walk.
+        """
+        entry = self.entries.get(self.output_key(url))
+        return entry["source_hash"] if entry != None and entry["template"] == None else None
+
+    def set_refs(self, dest_path, refs):
+        """
+        Record the (url, line) of every link and image on a page, and the current
+        signature of each local asset among them, so a changed asset rebuilds
+        the pages using it.
+        """
+        entry = self.entries[self.key(dest_path)]
+        entry["refs"] = sorted(set((url, line) for url, line in refs))
+        entry["assets"] = {}
+        for url in sorted(set(url for url, line in refs)):
+            signature = self.asset_signature(url)
+            if signature != None:
+                entry["assets"][url] = signature
+
+    def broken_refs(self):
+        """
+        Check every site-absolute link and image url recorded for a page against
+        the outputs of the build. Returns (source, line, url) for the ones that
+        don't resolve.
+        """
+        broken=[]
+        for key, entry in sorted(self.entries.items()):
+            for url, line in entry.get("refs", []):
+                if url_path(url) != None and self.resolve(url) == None:
+                    broken.append((entry["source"], line, url))
+        return broken
+
+    def prune(self):
+        """
+        Delete outputs whose sources were not visited this build. Returns the removed paths.
+        """
+        removed = []
+        for key in sorted(set(self.entries) - self.seen):
+            path = os.path.join(self.root, key)
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+            del self.entries[key]
+            # Clean up directories left empty by the removal.
+            parent = os.path.dirname(path)
+            while parent != os.path.normpath(self.root) and os.path.isdir(parent) and not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+        return removed
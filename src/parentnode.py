@@ -1,6 +1,8 @@
 from htmlnode import HTMLNode
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self,tag,children,value=None,props=None):
         self.tag=tag
         self.children=children
@@ -8,23 +10,24 @@ class ParentNode(HTMLNode):
         self.props=props
 
     def get_children(self, node):
-        html=""
+        return "".join(self.iter_children(node))
 
+    def iter_children(self, node):
         if not isinstance(node,ParentNode):
-            return node.to_html()
+            yield from node.iter_html()
         else:
-            html+=f"<{node.tag}{node.props_to_html()}>"
+            yield f"<{node.tag}{node.props_to_html()}>"
             for child in node.children:
-                if not isinstance(child,ParentNode):
-                    html+=child.to_html()
-                else:
-                    html+=child.get_children(child)
-            html+=f"</{node.tag}>"
-        return html
+                yield from self.iter_children(child)
+            yield f"</{node.tag}>"
 
-    def to_html(self):
+    def iter_html(self):
+        # Not a generator, so a bad node fails here and not halfway through writing a file.
         if self.tag == None:
             raise ValueError("No tag.")
         if not self.children:
             raise ValueError("No children.")
-        return self.get_children(self)
\ No newline at end of file
+        return self.iter_children(self)
+
+    def to_html(self):
+        return "".join(self.iter_html())
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+class Profiler():
+    """
+    Collects per-stage wall times, per-page timings and counters for one build,
+    and writes them out as a Chrome trace-event file (chrome://tracing, Perfetto).
+    Safe to use from several threads, each gets its own track in the trace.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.stages = {}    # stage name -> [seconds, calls]
+        self.pages = []     # (seconds, source path)
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add_stage(name, start, end, args)
+
+    def add_stage(self, name, start, end, args=None, pid=None):
+        pid = pid if pid != None else os.getpid()
+        with self.lock:
+            total = self.stages.setdefault(name, [0.0, 0])
+            total[0] += end - start
+            total[1] += 1
+            self.events.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                                "pid": pid, "tid": threading.get_native_id(), "args": args or {}})
+
+    def add_time(self, name, seconds, calls=1):
+        """
+        Add to a stage's totals without a trace event, for work interleaved too finely to trace.
+        """
+        with self.lock:
+            total = self.stages.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def page(self, path, seconds):
+        with self.lock:
+            self.pages.append((seconds, path))
+
+    def export(self):
+        return {"events": self.events, "stages": self.stages, "pages": self.pages, "counters": self.counters}
+
+    def merge(self, exported):
+        """
+        Add the results of a profiler from another process (see export).
+        """
+        self.events.extend(exported["events"])
+        for name, (seconds, calls) in exported["stages"].items():
+            total = self.stages.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+        self.pages.extend(exported["pages"])
+        for name, amount in exported["counters"].items():
+            self.count(name, amount)
+
+    def report(self, top=10):
+        lines=["Stage                          calls    seconds"]
+        for name, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:<30} {calls:>5} {seconds:>10.4f}")
+        for name, amount in sorted(self.counters.items()):
+            lines.append(f"{name}: {amount}")
+        if self.pages:
+            lines.append(f"Slowest {min(top, len(self.pages))} of {len(self.pages)} pages:")
+            for seconds, path in sorted(self.pages, reverse=True)[:top]:
+                lines.append(f"  {seconds:>8.4f}s  {path}")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        with open(path, "w") as fp:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, fp)
+
+# The profiler for this process, None unless a build asked for one.
+active = None
+
+def enable():
+    global active
+    active = Profiler()
+    return active
+
+def disable():
+    global active
+    profiler, active = active, None
+    return profiler
+
+def stage(name, **args):
+    if active == None:
+        return nullcontext()
+    return active.stage(name, **args)
+
+def count(name, amount=1):
+    if active != None:
+        active.count(name, amount)
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.add_time(name, time.perf_counter() - start)
+
+def timed_iter(name, iterable):
+    """
+    Yield from iterable, adding the time spent producing its items to name's totals.
+    """
+    profiler = active
+    seconds = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            finally:
+                seconds += time.perf_counter() - start
+            yield item
+    except StopIteration:
+        return
+    finally:
+        profiler.add_time(name, seconds)
+
+def timed_calls(name, fn):
+    """
+    fn, adding the time of every call to name's totals while profiling.
+    """
+    if active == None:
+        return fn
+    profiler = active
+    def timedFn(*args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            profiler.add_time(name, time.perf_counter() - start)
+    return timedFn
@@ -0,0 +1,100 @@
+import re
+
+PLACEHOLDER = re.compile(r"\{\{ (\w+) \}\}")
+URL_ATTRIBUTE = re.compile(r"(href|src)=\"([^\"]*)\"")
+URL_END = re.compile(r"[?#]")
+
+def rewrite_basepath(html, basepath):
+    if basepath == "/":
+        return html
+    html = html.replace("href=\"/", f"href=\"{basepath}")
+    return html.replace("src=\"/", f"src=\"{basepath}")
+
+def find_refs(html):
+    """
+    Return (url, line number) for every href and src attribute in html.
+    """
+    refs=[]
+    line = 1
+    last = 0
+    for match in URL_ATTRIBUTE.finditer(html):
+        line += html.count("\n", last, match.start())
+        last = match.start()
+        refs.append((match.group(2), line))
+    return refs
+
+def rewrite_urls(html, basepath, assets):
+    """
+    rewrite_basepath that also swaps every href and src url found in assets (a
+    {url: fingerprinted url} table) for its fingerprinted name, in one pass.
+    """
+    def replace(match):
+        url = match.group(2)
+        path = URL_END.split(url, 1)[0]
+        url = assets.get(path, path) + url[len(path):]
+        if url.startswith("/"):
+            url = basepath + url[1:]
+        return f"{match.group(1)}=\"{url}\""
+    return URL_ATTRIBUTE.sub(replace, html)
+
+class Template():
+    """
+    A page template parsed once into literal text and named slots ({{ Title }}, {{ Content }}, ...).
+    The literal text already has the basepath rewrite applied, so rendering a page is one join.
+    With assets, urls are also rewritten to the fingerprinted names in that table.
+    """
+    def __init__(self, text, basepath="/", assets=None):
+        self.basepath = basepath
+        self.assets = assets
+        # Literal text at even indices, (name, placeholder) slots at odd indices.
+        self.parts = []
+        last = 0
+        for match in PLACEHOLDER.finditer(text):
+            self.parts.append(self.rewrite(text[last:match.start()]))
+            self.parts.append((match.group(1), match.group(0)))
+            last = match.end()
+        self.parts.append(self.rewrite(text[last:]))
+        # Slots used more than once, a chunk iterable for those is gone through once and kept.
+        self.repeated = {name for name in self.slots if self.slots.count(name) > 1}
+
+    @classmethod
+    def load(cls, path, basepath="/", assets=None):
+        with open(path, "r") as tp:
+            return cls(tp.read(), basepath, assets)
+
+    def rewrite(self, html):
+        if self.assets:
+            return rewrite_urls(html, self.basepath, self.assets)
+        return rewrite_basepath(html, self.basepath)
+
+    @property
+    def slots(self):
+        return [slot[0] for slot in self.parts[1::2]]
+
+    def iter_render(self, **values):
+        """
+        Yield the page in chunks. A value can be a string or an iterable of
+        string chunks, like HTMLNode.iter_html(), so content never has to be
+        joined into one string, unless the template uses its slot more than once.
+        """
+        for name in self.repeated:
+            if name in values and not isinstance(values[name], str):
+                values[name] = list(values[name])
+        for i in range(0, len(self.parts), 2):
+            if self.parts[i]:
+                yield self.parts[i]
+            if i + 1 == len(self.parts):
+                break
+            name, placeholder = self.parts[i + 1]
+            if name not in values:
+                # Unknown placeholders are left in the page as they were.
+                yield placeholder
+            elif isinstance(values[name], str):
+                yield self.rewrite(values[name])
+            else:
+                # Chunks are whole tags or text, so an href="/ never spans two of them.
+                for chunk in values[name]:
+                    yield self.rewrite(chunk)
+
+    def render(self, **values):
+        return "".join(self.iter_render(**values))
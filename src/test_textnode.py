@@ -1,7 +1,7 @@
 import unittest
 
 from textnode import TextNode, TextType
-from htmlnode import HTMLNode
+from htmlnode import HTMLNode, escape_attr, escape_text
 from leafnode import LeafNode
 from parentnode import ParentNode
 from main import split_nodes_delimiter
@@ -9,11 +9,38 @@ from main import extract_markdown_images
 from main import split_nodes_image
 from main import split_images_string
 from main import text_to_textnodes
+from main import tokenize_inline
 from main import markdown_to_blocks
+from main import iter_blocks
 from main import BlockType
 from main import block_to_block_type
 from main import markdown_to_html_node
 from main import extract_title
+from main import BlockMemo
+from main import generate_pages_recursive
+from main import swap_dir
+from main import copyFiles
+from main import BuildTarget, generate_pages_fanout, parse_target
+from main import compress_static, copy_to_outputs, page_stale_reason
+from main import iter_mapped_lines, open_markdown
+import main
+from manifest import Manifest, hash_file, url_path
+from template import Template, find_refs, rewrite_urls
+from devserver import DevSite
+from bench import block_scaling, generate_corpus
+from cache import RenderCache
+from main import write_output
+from main import generate_page, generate_page_fanout, block_memo, set_block_memo_size
+import contextlib
+import gzip
+import tracemalloc
+import locale
+import io
+import json
+import mmap
+import profiler
+import os
+import tempfile
 
 class TestMarkdownFunctions(unittest.TestCase):
     def test_extract_title(self):
@@ -82,6 +109,12 @@ This is the same paragraph on a new line
             ],
         )
 
+    def test_iter_blocks_fences(self):
+        lines = io.StringIO("# title\n\n```\nfirst\n\n    indented\n```\n\n```inline```\ntext\n")
+        blocks = iter_blocks(lines)
+        self.assertEqual(next(blocks), "# title")
+        self.assertEqual(list(blocks), ["```\nfirst\n\n    indented\n```", "```inline```\ntext"])
+
     def test_blocks_to_blocks(self):
         md = """
 This is **bolded** paragraph
@@ -135,6 +168,21 @@ real code
             types.append(block_to_block_type(block))
         self.assertEqual(types,expected)
 
+    def test_block_type_edges(self):
+        cases = {
+            "```": BlockType.PARAGRAPH,
+            "``````": BlockType.CODE,
+            "```\ncode\n```\n": BlockType.CODE,
+            "```\ncode\n``": BlockType.PARAGRAPH,
+            "#no space": BlockType.PARAGRAPH,
+            "-no space": BlockType.PARAGRAPH,
+            "12. item": BlockType.ORDERED_LIST,
+            "12 item": BlockType.PARAGRAPH,
+            "": BlockType.PARAGRAPH,
+        }
+        for block, expected in cases.items():
+            self.assertEqual(block_to_block_type(block), expected, block)
+
     def test_paragraphs(self):
         md = """
     This is **bolded** paragraph
@@ -168,6 +216,11 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff</code></pre></div>",
         )
 
+    def test_codeblock_first_line_indent(self):
+        md = "```\n    indented()\nback()\n```"
+        self.assertEqual(markdown_to_html_node(md).to_html(), "<div><pre><code>    indented()\nback()</code></pre></div>")
+        self.assertEqual(markdown_to_html_node("```one line```").to_html(), "<div><pre><code>one line</code></pre></div>")
+
 
     def test_heading(self):
         md = """
@@ -234,6 +287,23 @@ the **same** even with inline stuff
             "<div><ol><li>multi line</li><li>ordered list</li><li>are different</li></ol></div>",
         )
 
+    def test_on_blocks(self):
+        seen = []
+        node = markdown_to_html_node("# heading\n\ntext", on_blocks=seen.extend)
+        self.assertEqual(seen, node.children)
+        self.assertEqual([block.to_html() for block in seen], ["<h1>heading</h1>", "<p>text</p>"])
+
+    def test_block_memo(self):
+        md = "[< Back Home](/)\n\n- one\n- **two**\n\n[< Back Home](/)"
+        memo = BlockMemo(max_entries=1)
+        html = markdown_to_html_node(md, memo=memo).to_html()
+        self.assertEqual(html, markdown_to_html_node(md).to_html())
+        self.assertEqual((memo.hits, memo.misses), (0, 3))
+        memo = BlockMemo()
+        markdown_to_html_node(md, memo=memo)
+        markdown_to_html_node(md, memo=memo)
+        self.assertEqual((memo.hits, memo.misses), (4, 2))
+
     def test_formatted_ul(self):
         md = """
 - ![rick roll](https://i.imgur.com/aKaOqIh.gif)
@@ -315,6 +385,32 @@ class TestSplitDelimiter(unittest.TestCase):
         #    self.assertEqual(str(nodes),'[TextNode(this is , TextType.TEXT, None), TextNode(text, TextType.BOLD, None), TextNode( with an , TextType.TEXT, None), TextNode(italic, TextType.ITALIC, None), TextNode( word and a , TextType.TEXT, None), TextNode(code block, TextType.CODE, None), TextNode( and an , TextType.TEXT, None), TextNode(obi wan image, TextType.IMAGE, https://i.imgur.com/fJRm4Vk.jpeg), TextNode( and a , TextType.TEXT, None), TextNode(link, TextType.LINK, https://boot.dev)]')
 
 
+class TestTokenizeInline(unittest.TestCase):
+    def chained(self, text):
+        nodes = [TextNode(text, TextType.TEXT)]
+        nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+        nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+        nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+        return split_nodes_image(nodes)
+
+    def test_same_as_chained_passes(self):
+        texts = [
+            "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+            "**one****two** three _four_",
+            "one **** two ____ `` three",
+            "***bold*** and a lone ! and [ bracket",
+            "[< Back Home](/)\n![image](/images/tom.png)",
+            "",
+        ]
+        for text in texts:
+            self.assertEqual(tokenize_inline(text), self.chained(text))
+
+    def test_missing_delimiter(self):
+        with self.assertRaises(Exception):
+            tokenize_inline("one **two three")
+        with self.assertRaises(Exception):
+            tokenize_inline("one `two three")
+
 class TestTextNode(unittest.TestCase):
     def test_eq(self):
         node = TextNode("This is a text node", TextType.BOLD)
@@ -332,6 +428,22 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a text node", TextType.BOLD)
         self.assertNotEqual(node, node2)
 
+    def test_slots(self):
+        for node in [TextNode("a", TextType.TEXT), LeafNode("p", "a"), ParentNode("div", [LeafNode("p", "a")]), HTMLNode()]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_to_html_matches_leaf(self):
+        for textType in [TextType.BOLD, TextType.ITALIC, TextType.CODE, TextType.LINK, TextType.IMAGE]:
+            node = TextNode("some text", textType, "/url")
+            self.assertEqual(node.to_html(), node.to_html_node().to_html())
+
+    def test_to_html_escaped(self):
+        self.assertEqual(TextNode("a<b", TextType.TEXT).to_html(), "a&lt;b")
+        self.assertEqual(TextNode("< Back", TextType.LINK, "/?a=1&b=2").to_html(), '<a href="/?a=1&amp;b=2">&lt; Back</a>')
+        self.assertEqual(TextNode('the "one"', TextType.IMAGE, "/a.png").to_html(), '<img src="/a.png" alt="the &quot;one&quot;"></img>')
+        node = TextNode("x & y", TextType.BOLD)
+        self.assertEqual(node.to_html(), node.to_html_node().to_html())
+
     def test_link_none(self):
         node = TextNode("This is a text node", TextType.BOLD)
         self.assertIsNone(node.url)
@@ -388,6 +500,22 @@ class TestLeafNode(unittest.TestCase):
     def test_leaf_props(self):
         node = LeafNode("p", "Hello, world!",{"href":"www.google.com"})
         self.assertEqual(node.to_html(), "<p href=\"www.google.com\">Hello, world!</p>")
+    def test_leaf_no_tag(self):
+        node = LeafNode(None, "<b>raw</b>")
+        self.assertEqual(node.to_html(), "<b>raw</b>")
+        self.assertEqual(list(node.iter_html()), ["<b>raw</b>"])
+    def test_leaf_props_escaped(self):
+        node = LeafNode("img", None, {"src": "/a.png", "alt": 'say "hi" & <bye>'})
+        self.assertEqual(node.to_html(), '<img src="/a.png" alt="say &quot;hi&quot; &amp; &lt;bye&gt;"></img>')
+        node.props = {"src": "/b.png"}
+        self.assertEqual(node.to_html(), '<img src="/b.png"></img>')
+
+    def test_escape(self):
+        text = "plain text, nothing to escape"
+        self.assertIs(escape_text(text), text)
+        self.assertEqual(escape_text("a < b && c > d"), "a &lt; b &amp;&amp; c &gt; d")
+        self.assertEqual(escape_attr('"x"'), "&quot;x&quot;")
+
     def test_print(self):
         node = LeafNode("p", "Hello, world!",{"href":"www.google.com"})
         self.assertEqual(str(node), "Tag=p, value=Hello, world!, props={'href': 'www.google.com'}")
@@ -416,5 +544,534 @@ class TestParentNode(unittest.TestCase):
             '<div style="{font-color=red;}"><span style="{font-color=green;}"><b hidden="true">grandchild</b></span></div>',
         )
 
+    def test_write_html(self):
+        grandchild_node = LeafNode("b", "grandchild")
+        child_node = ParentNode("span", [grandchild_node, LeafNode("img", None, {"src": "/a.png"})])
+        parent_node = ParentNode("div", [child_node])
+        sink = io.StringIO()
+        parent_node.write_html(sink)
+        self.assertEqual(sink.getvalue(), parent_node.to_html())
+        self.assertEqual(list(parent_node.iter_html()), ["<div>", "<span>", "<b>", "grandchild", "</b>", '<img src="/a.png">', "</img>", "</span>", "</div>"])
+
+    def test_iter_html_no_children(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", []).iter_html()
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self):
+        template = Template('<title>{{ Title }}</title><link href="/index.css">{{ Content }}{{ Title }}')
+        self.assertEqual(template.slots, ["Title", "Content", "Title"])
+        self.assertEqual(template.render(Title="t", Content="<p>c</p>"), '<title>t</title><link href="/index.css"><p>c</p>t')
+
+    def test_basepath(self):
+        template = Template('<link href="/index.css">{{ Content }}', "/site/")
+        self.assertEqual(template.parts[0], '<link href="/site/index.css">')
+        self.assertEqual(template.render(Content='<img src="/a.png">'), '<link href="/site/index.css"><img src="/site/a.png">')
+
+    def test_repeated_slot(self):
+        template = Template("{{ Content }}<hr>{{ Content }}")
+        self.assertEqual(template.render(Content=iter(["<p>", "c", "</p>"])), "<p>c</p><hr><p>c</p>")
+
+    def test_unknown_placeholder(self):
+        template = Template("{{ Title }} {{ Footer }}")
+        self.assertEqual(template.render(Title="t"), "t {{ Footer }}")
+
+class BuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.out = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        os.makedirs(os.path.join(self.content, "blog"))
+        with open(self.template, "w") as fp:
+            fp.write("<title>{{ Title }}</title>{{ Content }}")
+        for name in ["index.md", os.path.join("blog", "index.md")]:
+            with open(os.path.join(self.content, name), "w") as fp:
+                fp.write("# " + name + "\n\nsome text")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_tree(self, root):
+        files={}
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                with open(os.path.join(dirpath, name), "rb") as fp:
+                    files[os.path.relpath(os.path.join(dirpath, name), root)] = fp.read()
+        return files
+
+class TestManifest(BuildTestCase):
+    def build(self, static=None):
+        manifest = Manifest.load(self.out)
+        if static != None:
+            copyFiles(static, self.out, manifest)
+        explained = io.StringIO()
+        with contextlib.redirect_stdout(explained):
+            generate_pages_recursive(self.content, self.template, self.out, "/", manifest, explain=True)
+        self.explained = [line for line in explained.getvalue().splitlines() if line.startswith("Rebuilding")]
+        removed = manifest.prune()
+        manifest.save()
+        return removed
+
+    def test_explain_template_change(self):
+        self.build()
+        self.build()
+        self.assertEqual(self.explained, [])
+        with open(self.template, "a") as fp:
+            fp.write("<footer></footer>")
+        self.build()
+        self.assertEqual(sorted(self.explained), [
+            f"Rebuilding {os.path.join(self.out, 'blog', 'index.html')}: template changed",
+            f"Rebuilding {os.path.join(self.out, 'index.html')}: template changed",
+        ])
+        self.assertEqual(Manifest.load(self.out).entries["index.html"]["template"], self.template)
+
+    def test_asset_change_rebuilds_dependents(self):
+        static = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(static, "images"))
+        image = os.path.join(static, "images", "ring.png")
+        with open(image, "w") as fp:
+            fp.write("png")
+        with open(os.path.join(self.content, "blog", "index.md"), "a") as fp:
+            fp.write("\n\n![the ring](/images/ring.png) and [home](/index.html)")
+        self.build(static)
+        with open(image, "w") as fp:
+            fp.write("new png")
+        os.utime(image, ns=(0, 1))
+        self.build(static)
+        self.assertEqual(self.explained, [
+            f"Rebuilding {os.path.join(self.out, 'blog', 'index.html')}: referenced asset changed: /images/ring.png",
+        ])
+        # Links to other pages are refs, never assets.
+        entries = Manifest.load(self.out).entries
+        self.assertEqual(entries[os.path.join("blog", "index.html")]["assets"], {"/images/ring.png": "7:1"})
+
+    def test_skip_unchanged(self):
+        self.build()
+        page = os.path.join(self.out, "index.html")
+        os.utime(page, (0, 0))
+        self.build()
+        self.assertEqual(os.path.getmtime(page), 0)
+        with open(os.path.join(self.content, "index.md"), "a") as fp:
+            fp.write(" more")
+        self.build()
+        self.assertNotEqual(os.path.getmtime(page), 0)
+
+    def test_remove_deleted_source(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "index.md"))
+        removed = self.build()
+        self.assertEqual(removed, [os.path.join(self.out, "blog", "index.html")])
+        self.assertFalse(os.path.exists(os.path.join(self.out, "blog")))
+
+    def test_broken_refs(self):
+        with open(os.path.join(self.content, "blog", "index.md"), "a") as fp:
+            fp.write("\n\n- [home](/)\n- [tom](/blog/tom#top)\n\n[site](https://example.com) and\n[blog](/blog/)")
+        self.build()
+        manifest = Manifest.load(self.out)
+        self.assertEqual(manifest.broken_refs(), [(os.path.join(self.content, "blog", "index.md"), 6, "/blog/tom#top")])
+        self.assertEqual(manifest.resolve("/blog/"), os.path.join("blog", "index.html"))
+        self.assertEqual(find_refs('<a href="/">\n\n<img src="/x.png">'), [("/", 1), ("/x.png", 3)])
+
+class TestParallelBuild(BuildTestCase):
+    def test_same_as_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        generate_pages_recursive(self.content, self.template, serial, "/base/")
+        generate_pages_recursive(self.content, self.template, self.out, "/base/", jobs=2)
+        self.assertEqual(self.read_tree(serial), self.read_tree(self.out))
+
+    def test_pipelined_same_as_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        generate_pages_recursive(self.content, self.template, serial, "/base/")
+        generate_pages_recursive(self.content, self.template, self.out, "/base/", io_threads=1)
+        self.assertEqual(self.read_tree(serial), self.read_tree(self.out))
+
+    def test_fanout_same_as_separate_builds(self):
+        separate = [os.path.join(self.tmp.name, name) for name in ("root", "base")]
+        generate_pages_recursive(self.content, self.template, separate[0], "/")
+        generate_pages_recursive(self.content, self.template, separate[1], "/base/")
+        targets = [BuildTarget(os.path.join(self.tmp.name, name), basepath, self.template)
+                   for name, basepath in (("fan-root", "/"), ("fan-base", "/base/"))]
+        manifests = [Manifest(target.out_dir) for target in targets]
+        generate_pages_fanout(self.content, targets, manifests, jobs=2)
+        for target, built in zip(targets, separate):
+            self.assertEqual(self.read_tree(built), self.read_tree(target.out_dir))
+        self.assertEqual(parse_target("out,/base/"), BuildTarget("out", "/base/", None))
+
+class TestCompress(BuildTestCase):
+    def test_gzip_same_bytes_as_page(self):
+        dest = os.path.join(self.out, "page.html")
+        encoding = locale.getpreferredencoding
+        try:
+            for name in ("latin-1", "utf-8"):
+                locale.getpreferredencoding = lambda do_setlocale=True: name
+                write_output(dest, ["<p>caf\u00e9</p>"], {"html"})
+                files = self.read_tree(self.out)
+                self.assertEqual(files["page.html"], "<p>caf\u00e9</p>".encode(name))
+                self.assertEqual(gzip.decompress(files["page.html.gz"]), files["page.html"], name)
+        finally:
+            locale.getpreferredencoding = encoding
+
+    def test_failed_page_keeps_output(self):
+        src = os.path.join(self.content, "index.md")
+        dest = os.path.join(self.out, "index.html")
+        generate_page(src, self.template, dest, "/", compress={"html"})
+        before = self.read_tree(self.out)
+        with open(src, "a") as fp:
+            fp.write("\n\nbroken **bold")
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(Exception):
+            generate_page(src, self.template, dest, "/", compress={"html"})
+        # No cut off page or its temporary file is left behind.
+        self.assertEqual(self.read_tree(self.out), before)
+
+    def test_gzip_siblings(self):
+        static = os.path.join(self.tmp.name, "static")
+        os.makedirs(static)
+        for name in ("site.css", "photo.png"):
+            with open(os.path.join(static, name), "w") as fp:
+                fp.write("body { color: black; }" * 10)
+        manifest = Manifest(self.out)
+        compress_static(copy_to_outputs(static, [(self.out, manifest)], compress={"css", "html"}))
+        generate_pages_recursive(self.content, self.template, self.out, "/", manifest, compress={"css", "html"})
+        files = self.read_tree(self.out)
+        self.assertEqual(gzip.decompress(files["site.css.gz"]), files["site.css"])
+        self.assertEqual(gzip.decompress(files["index.html.gz"]), files["index.html"])
+        self.assertNotIn("photo.png.gz", files)
+        # Unchanged sources have nothing left to compress.
+        self.assertEqual(copy_to_outputs(static, [(self.out, manifest)], compress={"css", "html"}), [])
+        self.assertIsNone(page_stale_reason(manifest, os.path.join(self.out, "index.html"),
+                                            hash_file(os.path.join(self.content, "index.md")), hash_file(self.template), "/", {"css", "html"}))
+
+    def test_full_build_reuses_live_static(self):
+        static = os.path.join(self.tmp.name, "static")
+        os.makedirs(static)
+        for name in ("site.css", "photo.png"):
+            with open(os.path.join(static, name), "w") as fp:
+                fp.write("body { color: black; }" * 10)
+        live = Manifest(self.out)
+        first = {}
+        compress_static(copy_to_outputs(static, [(self.out, live)], compress={"css"}, assets=first))
+        live.save()
+        staging = os.path.join(self.tmp.name, "staging")
+        assets = {}
+        # Unchanged files are neither hashed for their fingerprint nor compressed again.
+        hashFile, main.hash_file = main.hash_file, lambda path: self.fail(f"hashed {path}")
+        try:
+            toCompress = copy_to_outputs(static, [(staging, Manifest(staging))], compress={"css"}, assets=assets,
+                                         previous=[Manifest.load(self.out)])
+        finally:
+            main.hash_file = hashFile
+        self.assertEqual(toCompress, [])
+        self.assertEqual(assets, first)
+        built = sorted(os.listdir(staging))
+        self.assertEqual(built, sorted(name for name in os.listdir(self.out) if name != ".manifest.json"))
+        for name in built:
+            self.assertTrue(os.path.samefile(os.path.join(staging, name), os.path.join(self.out, name)), name)
+        # A changed file is copied under its new name.
+        photo = os.path.join(static, "photo.png")
+        with open(photo, "w") as fp:
+            fp.write("new photo")
+        os.utime(photo, ns=(1, 1))
+        staging = os.path.join(self.tmp.name, "staging2")
+        assets = {}
+        copy_to_outputs(static, [(staging, Manifest(staging))], compress={"css"}, assets=assets, previous=[Manifest.load(self.out)])
+        self.assertNotEqual(assets["/photo.png"], first["/photo.png"])
+        with open(os.path.join(staging, assets["/photo.png"][1:])) as fp:
+            self.assertEqual(fp.read(), "new photo")
+        self.assertTrue(os.path.samefile(os.path.join(staging, assets["/site.css"][1:]), os.path.join(self.out, first["/site.css"][1:])))
+
+    def test_full_build_keeps_static_mode(self):
+        static = os.path.join(self.tmp.name, "static")
+        os.makedirs(static)
+        src = os.path.join(static, "site.css")
+        with open(src, "w") as fp:
+            fp.write("body {}")
+        built = self.out
+        for mode, linked in (("link", True), ("copy", False), ("link", True)):
+            staging = os.path.join(self.tmp.name, f"staging-{mode}-{linked}-{built == self.out}")
+            manifest = Manifest(staging)
+            copy_to_outputs(static, [(staging, manifest)], mode, previous=[Manifest.load(built)])
+            manifest.save()
+            self.assertEqual(os.path.samefile(os.path.join(staging, "site.css"), src), linked, mode)
+            built = staging
+
+class TestFingerprint(BuildTestCase):
+    def test_fingerprinted_assets(self):
+        static = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(static, "images"))
+        with open(os.path.join(static, "images", "ring.png"), "w") as fp:
+            fp.write("png")
+        with open(os.path.join(self.content, "index.md"), "a") as fp:
+            fp.write("\n\n![ring](/images/ring.png#top) [out](https://example.com/images/ring.png)")
+        manifest = Manifest(self.out)
+        assets = {}
+        copy_to_outputs(static, [(self.out, manifest)], assets=assets)
+        name = f"/images/ring.{hash_file(os.path.join(static, 'images', 'ring.png'))[:10]}.png"
+        self.assertEqual(assets, {"/images/ring.png": name})
+        manifest.aliases = {url_path(url): url_path(fingerprinted) for url, fingerprinted in assets.items()}
+        generate_pages_recursive(self.content, self.template, self.out, "/base/", manifest, assets=assets)
+        files = self.read_tree(self.out)
+        self.assertIn(name.lstrip("/"), files)
+        self.assertIn(f'src="/base{name}#top"'.encode(), files["index.html"])
+        self.assertIn(b'href="https://example.com/images/ring.png"', files["index.html"])
+        self.assertEqual(manifest.broken_refs(), [])
+
+    def test_rewrite_urls(self):
+        assets = {"/site.css": "/site.abc.css"}
+        self.assertEqual(rewrite_urls('<link href="/site.css"><a href="/blog/">', "/base/", assets),
+                         '<link href="/base/site.abc.css"><a href="/base/blog/">')
+        template = Template('<link href="/site.css">{{ Content }}', "/", assets)
+        self.assertEqual(template.render(Content='<img src="/site.css?v=1">'), '<link href="/site.abc.css"><img src="/site.abc.css?v=1">')
+
+class TestMappedMarkdown(BuildTestCase):
+    def test_same_blocks_as_text(self):
+        path = os.path.join(self.tmp.name, "big.md")
+        md = "# Title\r\n\nsome **text**\n\n```\n    code\n\n```\n\n- one\n- two"
+        with open(path, "w", newline="") as fp:
+            fp.write(md)
+        with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            self.assertEqual(list(iter_blocks(iter_mapped_lines(buffer))), list(iter_blocks(md.split("\n"))))
+
+    def test_mapped_page(self):
+        normal = os.path.join(self.tmp.name, "normal")
+        mapped = os.path.join(self.tmp.name, "mapped")
+        generate_pages_recursive(self.content, self.template, normal, "/")
+        threshold, main.MMAP_THRESHOLD = main.MMAP_THRESHOLD, 0
+        try:
+            generate_pages_recursive(self.content, self.template, mapped, "/")
+            generate_pages_recursive(self.content, self.template, self.out, "/", io_threads=1)
+        finally:
+            main.MMAP_THRESHOLD = threshold
+        self.assertEqual(self.read_tree(normal), self.read_tree(mapped))
+        self.assertEqual(self.read_tree(normal), self.read_tree(self.out))
+
+    def test_memory_bounded_by_block(self):
+        peaks=[]
+        threshold, main.MMAP_THRESHOLD = main.MMAP_THRESHOLD, 0
+        try:
+            for paragraphs in (5000, 20000):
+                path = os.path.join(self.tmp.name, f"{paragraphs}.md")
+                with open(path, "w") as fp:
+                    for i in range(paragraphs):
+                        fp.write(f"paragraph {i} with some words in it\n\n")
+                tracemalloc.start()
+                with open_markdown(path) as lines:
+                    blocks = sum(1 for block in iter_blocks(lines))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                self.assertEqual(blocks, paragraphs)
+        finally:
+            main.MMAP_THRESHOLD = threshold
+        # Four times the file, about the same peak.
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+    def test_page_memory_bounded_by_block(self):
+        template = Template.load(self.template, "/")
+        def single(src, dest):
+            generate_page(src, self.template, dest + ".html", "/", template)
+        def fanout(src, dest):
+            generate_page_fanout(src, [(template, dest + ".html"), (Template.load(self.template, "/base/"), dest + ".base.html")])
+        threshold, memoSize = main.MMAP_THRESHOLD, block_memo.max_entries
+        # A small memo, whose churn is bounded anyway, so the peak is the page's.
+        set_block_memo_size(64)
+        try:
+            for mapThreshold, build in ((threshold, single), (0, single), (threshold, fanout)):
+                main.MMAP_THRESHOLD = mapThreshold
+                peaks=[]
+                for paragraphs in (2000, 8000):
+                    path = os.path.join(self.tmp.name, f"{paragraphs}.md")
+                    with open(path, "w") as fp:
+                        fp.write("# big page\n\n")
+                        for i in range(paragraphs):
+                            fp.write(f"paragraph {i} with **some** words in it\n\n")
+                    block_memo.clear()
+                    tracemalloc.start()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        build(path, os.path.join(self.tmp.name, str(paragraphs)))
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                with open(os.path.join(self.tmp.name, "8000.html")) as fp:
+                    self.assertTrue(fp.read().endswith("<p>paragraph 7999 with <b>some</b> words in it</p></div>"))
+                # Four times the page, about the same peak.
+                self.assertLess(peaks[1], peaks[0] * 1.5, build.__name__)
+        finally:
+            main.MMAP_THRESHOLD = threshold
+            set_block_memo_size(memoSize)
+
+class TestCopyFiles(BuildTestCase):
+    def test_link(self):
+        copyFiles(self.content, self.out, mode="link")
+        src = os.path.join(self.content, "blog", "index.md")
+        self.assertTrue(os.path.samefile(src, os.path.join(self.out, "blog", "index.md")))
+
+    def test_skip_same_size_and_mtime(self):
+        copyFiles(self.content, self.out)
+        dest = os.path.join(self.out, "index.md")
+        with open(dest, "w") as fp:
+            fp.write("x" * os.path.getsize(os.path.join(self.content, "index.md")))
+        os.utime(dest, ns=(0, os.stat(os.path.join(self.content, "index.md")).st_mtime_ns))
+        copyFiles(self.content, self.out)
+        with open(dest) as fp:
+            self.assertTrue(fp.read().startswith("xxx"))
+
+class TestBenchCorpus(BuildTestCase):
+    def test_corpus_builds(self):
+        corpus = os.path.join(self.tmp.name, "corpus")
+        texts = generate_corpus(corpus, pages=5, blocks=20, seed=1)
+        self.assertEqual(texts, generate_corpus(os.path.join(self.tmp.name, "again"), pages=5, blocks=20, seed=1))
+        generate_pages_recursive(corpus, self.template, self.out, "/")
+        self.assertEqual(len(self.read_tree(self.out)), 5)
+
+    def test_block_scaling_linear_memory(self):
+        for kind in ("list", "code"):
+            small, large = block_scaling(kind, [500, 4000], repeat=1)
+            self.assertLess(large["peak_bytes_per_line"], small["peak_bytes_per_line"] * 1.5)
+
+class TestRenderCache(BuildTestCase):
+    def test_reuse(self):
+        cache = RenderCache(os.path.join(self.tmp.name, "cache"))
+        src = os.path.join(self.content, "index.md")
+        dest = os.path.join(self.out, "index.html")
+        generate_page(src, self.template, dest, "/", cache=cache)
+        with open(dest) as fp:
+            first = fp.read()
+        entries = cache.entries()
+        self.assertEqual(len(entries), 1)
+        # Prove the second build reads the cache and not the markdown.
+        with open(entries[0][2], "w") as fp:
+            fp.write("cached title\n<p>cached</p>\n[]")
+        generate_page(src, self.template, dest, "/base/", cache=cache)
+        with open(dest) as fp:
+            self.assertEqual(fp.read(), "<title>cached title</title><p>cached</p>")
+        self.assertIn("<p>some text</p>", first)
+
+    def test_template_without_content(self):
+        cache = RenderCache(os.path.join(self.tmp.name, "cache"))
+        with open(self.template, "w") as fp:
+            fp.write("<title>{{ Title }}</title>")
+        src = os.path.join(self.content, "index.md")
+        dest = os.path.join(self.out, "index.html")
+        with contextlib.redirect_stdout(io.StringIO()):
+            info = generate_page(src, self.template, dest, "/", cache=cache)
+        with open(dest) as fp:
+            self.assertEqual(fp.read(), "<title>index.md</title>")
+        # The page was still parsed, into the cache too.
+        self.assertEqual(info.hits + info.misses, 2)
+        self.assertEqual(len(cache.entries()), 1)
+
+    def test_evict_lru(self):
+        cache = RenderCache(os.path.join(self.tmp.name, "cache"), max_bytes=250)
+        for i in range(5):
+            key = cache.key(str(i))
+            list(cache.put(key, "t", ["x" * 100]))
+            os.utime(cache.path(key), ns=(i, i))
+        self.assertLessEqual(cache.size, 250)
+        self.assertIsNotNone(cache.get(cache.key("4")))
+        self.assertIsNone(cache.get(cache.key("0")))
+
+    def test_get_evicted_after_open(self):
+        cache = RenderCache(os.path.join(self.tmp.name, "cache"))
+        key = cache.key("page")
+        list(cache.put(key, "t", ["<p>x</p>"], [["/", 1]]))
+        realUtime = os.utime
+        def evicted(path, *args, **kwargs):
+            os.remove(path)
+            realUtime(path, *args, **kwargs)
+        os.utime = evicted
+        try:
+            title, refs, chunks = cache.get(key)
+        finally:
+            os.utime = realUtime
+        self.assertEqual((title, refs, "".join(chunks)), ("t", [["/", 1]], "<p>x</p>"))
+
+class TestProfiler(BuildTestCase):
+    def test_profile_build(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        generate_pages_recursive(self.content, self.template, serial, "/")
+        built = profiler.enable()
+        try:
+            generate_pages_recursive(self.content, self.template, self.out, "/", jobs=2)
+        finally:
+            profiler.disable()
+        self.assertEqual(self.read_tree(serial), self.read_tree(self.out))
+        self.assertEqual(built.counters["pages"], 2)
+        self.assertEqual(built.counters["bytes written"], sum(len(html) for html in self.read_tree(self.out).values()))
+        for name in ["walk content", "read template", "page", "parse", "serialize", "write", "split blocks", "build nodes"]:
+            self.assertIn(name, built.stages)
+        self.assertIn(os.path.join(self.content, "index.md"), built.report())
+        trace = os.path.join(self.tmp.name, "trace.json")
+        built.write_trace(trace)
+        with open(trace) as fp:
+            events = json.load(fp)["traceEvents"]
+        self.assertTrue(all(event["ph"] == "X" for event in events))
+
+    def test_profile_pipelined_build(self):
+        built = profiler.enable()
+        try:
+            generate_pages_recursive(self.content, self.template, self.out, "/", io_threads=2)
+        finally:
+            profiler.disable()
+        self.assertEqual(built.counters["pages"], 2)
+        self.assertEqual(built.counters["bytes written"], sum(len(html) for html in self.read_tree(self.out).values()))
+        self.assertGreater(built.counters["bytes read"], 0)
+        for name in ["read", "page", "parse", "serialize", "write"]:
+            self.assertIn(name, built.stages)
+        self.assertEqual(sorted(path for seconds, path in built.pages),
+                         sorted([os.path.join(self.content, "index.md"), os.path.join(self.content, "blog", "index.md")]))
+
+    def test_profile_fanout_build(self):
+        targets = [BuildTarget(os.path.join(self.tmp.name, name), basepath, self.template)
+                   for name, basepath in (("fan-root", "/"), ("fan-base", "/base/"))]
+        built = profiler.enable()
+        try:
+            generate_pages_fanout(self.content, targets, [None, None])
+        finally:
+            profiler.disable()
+        # Each page is read once and written once per target.
+        self.assertEqual(built.counters["pages"], 4)
+        self.assertEqual(built.counters["bytes read"],
+                         sum(os.path.getsize(os.path.join(self.content, *path)) for path in (["index.md"], ["blog", "index.md"])))
+        self.assertEqual(built.counters["bytes written"],
+                         sum(len(html) for target in targets for html in self.read_tree(target.out_dir).values()))
+
+    def test_nodes_counted_through_memo(self):
+        md = "# title\n\n- one\n- two\n\n- one\n- two"
+        counts=[]
+        for memo in (None, BlockMemo()):
+            built = profiler.enable()
+            try:
+                markdown_to_html_node(md, memo=memo)
+            finally:
+                profiler.disable()
+            counts.append(built.counters["nodes"])
+        # h1, and ul with two li twice, the second list a memo hit.
+        self.assertEqual(counts, [7, 7])
+
+class TestSwapDir(BuildTestCase):
+    def test_swap(self):
+        generate_pages_recursive(self.content, self.template, self.out, "/")
+        staging = os.path.join(self.tmp.name, "staging")
+        os.makedirs(staging)
+        with open(os.path.join(staging, "new.html"), "w") as fp:
+            fp.write("new")
+        swap_dir(staging, self.out)
+        self.assertFalse(os.path.exists(staging))
+        self.assertEqual(os.listdir(self.out), ["new.html"])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["content", "docs", "template.html"])
+
+class TestDevSite(BuildTestCase):
+    def test_rebuild_changed(self):
+        site = DevSite(self.content, self.template, self.tmp.name)
+        self.assertIn(b"<p>some text</p>", site.lookup("/blog/"))
+        blog = site.pages["/blog/index.html"]
+        src = os.path.join(self.content, "index.md")
+        with open(src, "w") as fp:
+            fp.write("# index\n\nnew text")
+        os.utime(src, ns=(1, 1))
+        self.assertEqual(site.rebuild(), [src])
+        self.assertIn(b"<p>new text</p>", site.lookup("/"))
+        self.assertIs(site.pages["/blog/index.html"], blog)
+        self.assertEqual(site.rebuild(), [])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,4 +1,5 @@
 from leafnode import LeafNode
+from htmlnode import escape_attr, escape_text
 from enum import Enum
 
 class TextType(Enum):
@@ -11,6 +12,8 @@ class TextType(Enum):
 
 
 class TextNode():
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -28,17 +31,18 @@ class TextNode():
             raise Exception("Invalid text node")
         match(self.text_type):
             case TextType.TEXT:
-                return self.text.replace("\n"," ") # This makes no sense, but the provided unit test requires it.
+                return escape_text(self.text).replace("\n"," ") # This makes no sense, but the provided unit test requires it.
+            # Formatted directly, the same as LeafNode would, without building one.
             case TextType.BOLD:
-                return LeafNode("b",self.text).to_html() #f"<b>{self.text}</b>"
+                return f"<b>{escape_text(self.text)}</b>"
             case TextType.ITALIC:
-                return LeafNode("i",self.text).to_html() #f"<i>{self.text}</i>"
+                return f"<i>{escape_text(self.text)}</i>"
             case TextType.CODE:
-                return LeafNode("code",self.text).to_html() #f"<code>{self.text}</code>"
+                return f"<code>{escape_text(self.text)}</code>"
             case TextType.LINK:
-                return LeafNode("a",self.text,{"href":self.url}).to_html() #f"<a href=\"{self.url}\">{self.text}</a>"
+                return f"<a href=\"{escape_attr(self.url)}\">{escape_text(self.text)}</a>"
             case TextType.IMAGE:
-                return LeafNode("img",None,{"src":self.url,"alt":self.text}).to_html() #f"<img src=\"{self.url}\" alt=\"{self.text}\"</img>"
+                return f"<img src=\"{escape_attr(self.url)}\" alt=\"{escape_attr(self.text)}\"></img>"
             case _:
                 raise Exception("Invalid text type")
     
@@ -48,15 +52,15 @@ class TextNode():
             raise Exception("Invalid text node")
         match(self.text_type):
             case TextType.TEXT:
-                return LeafNode(None,self.text)
+                return LeafNode(None,escape_text(self.text))
             case TextType.BOLD:
-                return LeafNode("b",self.text) #f"<b>{self.text}</b>"
+                return LeafNode("b",escape_text(self.text)) #f"<b>{self.text}</b>"
             case TextType.ITALIC:
-                return LeafNode("i",self.text) #f"<i>{self.text}</i>"
+                return LeafNode("i",escape_text(self.text)) #f"<i>{self.text}</i>"
             case TextType.CODE:
-                return LeafNode("code",self.text) #f"<code>{self.text}</code>"
+                return LeafNode("code",escape_text(self.text)) #f"<code>{self.text}</code>"
             case TextType.LINK:
-                return LeafNode("a",self.text,{"href":self.url}) #f"<a href=\"{self.url}\">{self.text}</a>"
+                return LeafNode("a",escape_text(self.text),{"href":self.url}) #f"<a href=\"{self.url}\">{self.text}</a>"
             case TextType.IMAGE:
                 return LeafNode("img",None,{"src":self.url,"alt":self.text}) #f"<img src=\"{self.url}\" alt=\"{self.text}\"</img>"
             case _: